@@ -0,0 +1,91 @@
+# benchmarks/batch.py
+#
+# POST /batch frente a las mismas peticiones GET una a una, en proceso
+# (cliente de pruebas de Flask, sin red) y sobre una BD SQLite temporal.
+# Se mide con los listados servidos desde snapshot, tanto con send_file
+# como con X-Accel-Redirect, y se comprueba que cada cuerpo del batch es
+# el mismo que devuelve la petición suelta: si no, termina con error.
+#
+#   python -m benchmarks.batch
+#   python -m benchmarks.batch --details 40 --rounds 500
+#
+# Opciones: --items N (personas y planetas en la BD)
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+
+def seed(database, items):
+    from src.app import create_app
+    from src.models import db, Person, Planet
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}'})
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Person(name=f'Person {i}') for i in range(1, items + 1)])
+        db.session.add_all([Planet(name=f'Planet {i}') for i in range(1, items + 1)])
+        db.session.commit()
+        app.extensions['catalog_snapshots'].build()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('--details', type=int, default=20, help='detalles por batch')
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    os.environ.setdefault('AUTH_SIGNING_KEYS', 'bench:benchmark-signing-key')
+    tmpdir = tempfile.mkdtemp()
+    database = os.path.join(tmpdir, 'bench.db')
+    snapshots = tempfile.mkdtemp(dir=tmpdir)
+    os.environ['CATALOG_SNAPSHOT_DIR'] = snapshots
+    seed(database, args.items)
+
+    from src.app import create_app
+
+    for accel_prefix in (None, '/_snapshots'):
+        if accel_prefix:
+            os.environ['CATALOG_SNAPSHOT_ACCEL_PREFIX'] = accel_prefix
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}'})
+        client = app.test_client()
+        paths = ['/people', '/planets'] + [
+            f'/{random.choice(["people", "planets"])}/{random.randint(1, args.items)}'
+            for _ in range(args.details)]
+
+        # Cuerpos de referencia: cada GET suelto, servido por HTTP normal
+        os.environ.pop('CATALOG_SNAPSHOT_ACCEL_PREFIX', None)
+        reference_app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}'})
+        reference = reference_app.test_client()
+        expected = [reference.get(path).get_json() for path in paths]
+        if accel_prefix:
+            os.environ['CATALOG_SNAPSHOT_ACCEL_PREFIX'] = accel_prefix
+
+        response = client.post('/batch', json={'requests': [{'path': path} for path in paths]})
+        if response.status_code != 200 or \
+                [sub['body'] for sub in response.get_json()['responses']] != expected:
+            raise SystemExit(f'batch bodies differ from single requests '
+                             f'(status {response.status_code}, accel={accel_prefix})')
+
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            for path in paths:
+                reference.get(path).get_data()
+        single = (time.perf_counter() - started) / args.rounds * 1000
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            client.post('/batch', json={'requests': [{'path': path} for path in paths]}).get_data()
+        batched = (time.perf_counter() - started) / args.rounds * 1000
+        mode = 'X-Accel-Redirect' if accel_prefix else 'send_file'
+        print(f'{mode:<17} {len(paths)} GETs: one by one {single:7.2f} ms  '
+              f'batch {batched:7.2f} ms  bodies match: True')
+    os.environ.pop('CATALOG_SNAPSHOT_ACCEL_PREFIX', None)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# benchmarks/favorite_shards.py
+#
+# Favoritos repartidos entre varios ficheros SQLite (FAVORITES_SHARDS):
+#
+#  1. Carga favoritos al azar en la BD principal (sin shards).
+#  2. Migra a N shards con `flask rebalance-favorites --from-main` y
+#     comprueba que top_favorites y los favoritos de cada usuario no cambian.
+#  3. Escrituras por segundo (añadir favorito + commit desde varios hilos)
+#     sin shards, con 1 shard y con N: en SQLite cada fichero tiene su
+#     propio lock de escritura.
+#  4. Añade un shard más, rebalancea y mide qué fracción de filas se mueve
+#     (con hash consistente, ~1/(N+1)).
+#
+#   python -m benchmarks.favorite_shards
+#   python -m benchmarks.favorite_shards --shards 8 --threads 16 --seconds 10
+#
+# Opciones: --users N, --favorites N (por usuario)
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+from sqlalchemy import insert
+
+
+def create(db_path, shard_paths):
+    from src.app import create_app
+
+    os.environ['FAVORITES_SHARDS'] = ','.join(f's{i}=sqlite:///{path}' for i, path in shard_paths)
+    return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'})
+
+
+def seed(app, users, favorites):
+    from src.models import db, User, Person, Planet, favorite_planets, favorite_characters
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [{'username': f'user{i}', 'email': f'user{i}@example.com',
+                                           'password': 'x'} for i in range(1, users + 1)])
+        db.session.execute(insert(Planet), [{'name': f'Planet {i}'} for i in range(1, 61)])
+        db.session.execute(insert(Person), [{'name': f'Person {i}'} for i in range(1, 101)])
+        for table, column, items in ((favorite_planets, 'planet_id', 60),
+                                     (favorite_characters, 'person_id', 100)):
+            rows = [{'user_id': user_id, column: item_id}
+                    for user_id in range(1, users + 1)
+                    # Sesgo hacia los primeros items para que haya un top claro
+                    for item_id in {min(items, int(random.paretovariate(1.2))) for _ in range(favorites)}]
+            if rows:
+                db.session.execute(insert(table), rows)
+        db.session.commit()
+
+
+def snapshot(app, users):
+    """top_favorites y los favoritos de una muestra de usuarios."""
+    from src.favorites import top_favorites, list_favorites
+
+    with app.app_context():
+        sample = range(1, users + 1, max(1, users // 200))
+        return ({kind: top_favorites(kind, 20) for kind in ('planet', 'people')},
+                {(user_id, kind): [item.id for item in list_favorites(user_id, kind)]
+                 for user_id in sample for kind in ('planet', 'people')})
+
+
+def rebalance(app, *args):
+    result = app.test_cli_runner().invoke(args=['rebalance-favorites', *args])
+    if result.exit_code != 0:
+        raise SystemExit(result.output)
+    return result.output.strip().splitlines()[-1]
+
+
+def shard_rows(app):
+    from src.favorite_shards import SHARD_TABLES
+    from sqlalchemy import select, func
+
+    counts = {}
+    for name, engine in app.extensions['favorite_shards'].engines.items():
+        with engine.connect() as connection:
+            counts[name] = sum(connection.scalar(select(func.count()).select_from(table))
+                               for table, _ in SHARD_TABLES.values())
+    return counts
+
+
+def measure_writes(app, users, threads, seconds):
+    from src.models import db
+    from src.favorites import is_favorite, add_favorite, remove_favorite
+
+    done = []
+    deadline = time.perf_counter() + seconds
+
+    def writer():
+        count = 0
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                user_id, item_id = random.randint(1, users), random.randint(1, 60)
+                # Como las vistas: comprobar, escribir y commit
+                if is_favorite(user_id, 'planet', item_id):
+                    remove_favorite(user_id, 'planet', item_id)
+                else:
+                    add_favorite(user_id, 'planet', item_id)
+                db.session.commit()
+                count += 1
+        done.append(count)
+
+    workers = [threading.Thread(target=writer) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return sum(done) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--favorites', type=int, default=8)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    os.environ.setdefault('AUTH_SIGNING_KEYS', 'bench:benchmark-signing-key')
+    with tempfile.TemporaryDirectory() as tmp:
+        main_db = os.path.join(tmp, 'main.db')
+        shards = [(i, os.path.join(tmp, f'shard{i}.db')) for i in range(args.shards + 1)]
+
+        unsharded = create(main_db, [])
+        seed(unsharded, args.users, args.favorites)
+        before = snapshot(unsharded, args.users)
+
+        sharded = create(main_db, shards[:args.shards])
+        print(f'--from-main: {rebalance(sharded, "--from-main")}, rows per shard: {shard_rows(sharded)}')
+        print('top_favorites and user favorites unchanged:', snapshot(sharded, args.users) == before)
+
+        single = create(os.path.join(tmp, 'single.db'), [(0, os.path.join(tmp, 'single-shard.db'))])
+        seed(single, args.users, 0)
+        single.test_cli_runner().invoke(args=['init-favorite-shards'])
+        for label, app in (('no shards', unsharded), ('1 shard', single),
+                           (f'{args.shards} shards', sharded)):
+            rate = measure_writes(app, args.users, args.threads, args.seconds)
+            print(f'{label:<12} {rate:>8.0f} writes/s ({args.threads} threads)')
+
+        before = snapshot(sharded, args.users)
+        total = sum(shard_rows(sharded).values())
+        grown = create(main_db, shards)
+        line = rebalance(grown)
+        moved = int(line.split()[2])
+        print(f'{args.shards} -> {args.shards + 1} shards: {line} '
+              f'({moved / total:.1%} of {total}, ideal {1 / (args.shards + 1):.1%})')
+        print('top_favorites and user favorites unchanged:', snapshot(grown, args.users) == before)
+
+
+if __name__ == '__main__':
+    main()
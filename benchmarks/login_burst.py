@@ -0,0 +1,129 @@
+# benchmarks/login_burst.py
+#
+# Latencia de lecturas del catálogo (GET /people) mientras llega una
+# ráfaga de logins concurrentes. Levanta la app en un servidor werkzeug
+# con hilos sobre una BD SQLite temporal.
+#
+#   python -m benchmarks.login_burst                      # pool de procesos
+#   PASSWORD_HASH_WORKERS=0 python -m benchmarks.login_burst   # hash en el worker
+#
+# Opciones: --logins N (hilos haciendo login), --seconds S, --readers N
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+import urllib.request
+import urllib.error
+
+from werkzeug.serving import make_server
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def request(url, body=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def measure_reads(base_url, seconds, readers):
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def reader():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            request(base_url + '/people')
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed * 1000)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=2)
+    args = parser.parse_args()
+    os.environ.setdefault('AUTH_SIGNING_KEYS', 'bench:benchmark-signing-key')
+
+    from src.app import create_app
+    from src.models import db, User, Person
+    from src.passwords import hash_password
+
+    tmpdir = tempfile.mkdtemp()
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmpdir}/bench.db'})
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='bench', email='bench@example.com',
+                            password=hash_password('bench-password')))
+        db.session.add_all([Person(name=f'Person {i}') for i in range(200)])
+        db.session.commit()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    # Calentamos el pool de hashing para no medir su arranque
+    request(base_url + '/login', {'username': 'bench', 'password': 'bench-password'})
+
+    baseline = measure_reads(base_url, args.seconds, args.readers)
+
+    stop = threading.Event()
+    statuses = {}
+    status_lock = threading.Lock()
+
+    def login_loop():
+        while not stop.is_set():
+            status = request(base_url + '/login', {'username': 'bench', 'password': 'bench-password'})
+            with status_lock:
+                statuses[status] = statuses.get(status, 0) + 1
+            if status == 503:
+                # Un cliente real respetaría Retry-After; aquí basta con ceder
+                time.sleep(0.1)
+
+    burst = [threading.Thread(target=login_loop) for _ in range(args.logins)]
+    for t in burst:
+        t.start()
+    during = measure_reads(base_url, args.seconds, args.readers)
+    stop.set()
+    for t in burst:
+        t.join()
+    server.shutdown()
+
+    mode = 'inline' if os.environ.get('PASSWORD_HASH_WORKERS') == '0' else 'process pool'
+    print(f'hashing: {mode}, {args.logins} concurrent login clients')
+    for label, values in (('baseline', baseline), ('login burst', during)):
+        print(f'  {label:12s} GET /people  n={len(values):5d}  '
+              f'p50={statistics.median(values):7.2f} ms  '
+              f'p99={percentile(values, 0.99):7.2f} ms  max={max(values):7.2f} ms')
+    print(f'  login responses: {dict(sorted(statuses.items()))}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# benchmarks/prefork.py
+#
+# Memoria por worker y tiempo hasta la primera respuesta de gunicorn,
+# con y sin precarga de la app (gunicorn.conf.py). Arranca gunicorn sobre
+# una BD SQLite temporal, espera al primer 200 de GET /people y lee la
+# memoria de cada worker en /proc (solo Linux).
+#
+#   python -m benchmarks.prefork                 # compara preload y sin preload
+#   python -m benchmarks.prefork --workers 8
+#
+# RSS cuenta también las páginas compartidas con el master; PSS las
+# reparte entre los procesos que las comparten y USS son solo las
+# privadas del worker, lo que de verdad cuesta añadir uno más.
+
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import statistics
+import urllib.request
+import urllib.error
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def create_database(path):
+    from src.app import create_app
+    from src.models import db, Person, Planet
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Person(name=f'Person {i}') for i in range(500)])
+        db.session.add_all([Planet(name=f'Planet {i}') for i in range(500)])
+        db.session.commit()
+
+
+def get(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            response.read()
+            status = response.status
+    except (urllib.error.URLError, ConnectionError):
+        status = None
+    return status, (time.perf_counter() - start) * 1000
+
+
+def worker_pids(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as handle:
+        return [int(pid) for pid in handle.read().split()]
+
+
+def memory_kb(pid):
+    """(rss, pss, uss) en kB, de /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as handle:
+        for line in handle:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields['Rss'], fields['Pss'], fields['Private_Clean'] + fields['Private_Dirty']
+
+
+def run(preload, workers, database, snapshots, requests_per_worker):
+    port = free_port()
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{database}',
+               CATALOG_SNAPSHOT_DIR=snapshots,
+               GUNICORN_PRELOAD='1' if preload else '0',
+               WEB_CONCURRENCY=str(workers),
+               PORT=str(port))
+    base_url = f'http://127.0.0.1:{port}'
+
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                               cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            status, first_ms = get(base_url + '/people')
+            if status == 200:
+                break
+            if process.poll() is not None:
+                raise RuntimeError('gunicorn exited during start-up')
+            time.sleep(0.01)
+        ready = time.perf_counter() - started
+
+        # Esperamos a que estén todos los workers antes de medir
+        while len(worker_pids(process.pid)) < workers:
+            time.sleep(0.05)
+        # Una ronda corta de peticiones para que cada worker haya servido
+        # alguna y su memoria refleje el estado estable
+        latencies = [get(base_url + path)[1]
+                     for _ in range(requests_per_worker * workers)
+                     for path in ('/people', '/planets', '/people/1')]
+        time.sleep(0.5)
+        usage = [memory_kb(pid) for pid in worker_pids(process.pid)]
+        master = memory_kb(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+    return ready, first_ms, latencies, usage, master
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=5,
+                        help='Peticiones por worker antes de medir la memoria')
+    args = parser.parse_args()
+    os.environ.setdefault('AUTH_SIGNING_KEYS', 'bench:benchmark-signing-key')
+
+    tmpdir = tempfile.mkdtemp()
+    database = os.path.join(tmpdir, 'bench.db')
+    create_database(database)
+
+    print(f'{args.workers} workers')
+    for preload in (True, False):
+        # Cada modo empieza sin snapshots publicados
+        snapshots = tempfile.mkdtemp(dir=tmpdir)
+        ready, first_ms, latencies, usage, master = run(
+            preload, args.workers, database, snapshots, args.requests)
+        rss, pss, uss = (statistics.mean(values) / 1024 for values in zip(*usage))
+        total_pss = (sum(u[1] for u in usage) + master[1]) / 1024
+        print(f'  preload={"on " if preload else "off"}  '
+              f'ready={ready:6.2f} s  first request={first_ms:7.1f} ms  '
+              f'p50={statistics.median(latencies):5.1f} ms  '
+              f'worker RSS={rss:6.1f} MB  PSS={pss:6.1f} MB  USS={uss:6.1f} MB  '
+              f'total PSS={total_pss:6.1f} MB')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
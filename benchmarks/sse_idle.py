@@ -0,0 +1,152 @@
+# benchmarks/sse_idle.py
+#
+# Muchas conexiones ociosas a GET /stream contra gunicorn (gunicorn.conf.py)
+# con un solo worker: abre N streams autenticados, los mantiene abiertos
+# más tiempo que el `timeout` de gunicorn y, mientras tanto, mide la
+# latencia de GET /people. Al final cuenta cuántos streams siguen vivos y
+# han recibido algún keep-alive, y la memoria del worker.
+#
+#   python -m benchmarks.sse_idle                       # 2000 streams, gevent
+#   python -m benchmarks.sse_idle --streams 5000 --hold 40
+#   python -m benchmarks.sse_idle --worker-class sync --streams 50
+#
+# Con `sync` cada stream ocupa el worker entero: el resto de conexiones
+# (y GET /people) esperan hasta que gunicorn lo mata por timeout.
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from benchmarks.prefork import ROOT, free_port, create_database, get, worker_pids, memory_kb
+
+SIGNING_KEYS = 'bench:sse-idle-benchmark-key'
+
+
+def issue_token(database):
+    from src.app import create_app
+    from src.models import db, User
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}'})
+    with app.app_context():
+        user = User(username='sse', email='sse@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        return app.extensions['token_signer'].issue(user.id)
+
+
+class Stream:
+
+    def __init__(self):
+        self.status = None
+        self.keepalives = 0
+        self.closed = False
+
+
+async def open_stream(port, token, stream):
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET /stream HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                     f'Authorization: Bearer {token}\r\n\r\n'.encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        stream.status = int(status_line.split()[1]) if status_line else None
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if b'keep-alive' in line:
+                stream.keepalives += 1
+    except (OSError, ValueError, IndexError):
+        pass
+    stream.closed = True
+
+
+async def sample_latency(port, seconds, interval=0.5):
+    latencies, failures = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            status, ms = await asyncio.to_thread(get, f'http://127.0.0.1:{port}/people')
+        except OSError:
+            status = None
+        if status == 200:
+            latencies.append(ms)
+        else:
+            failures += 1
+        await asyncio.sleep(interval)
+    return latencies, failures
+
+
+async def hold_streams(port, token, count, hold):
+    streams = [Stream() for _ in range(count)]
+    tasks = []
+    for stream in streams:
+        tasks.append(asyncio.create_task(open_stream(port, token, stream)))
+        # Sin ráfaga de SYN: el backlog del socket es finito
+        await asyncio.sleep(0.0005)
+    latencies, failures = await sample_latency(port, hold)
+    for task in tasks:
+        task.cancel()
+    return streams, latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--streams', type=int, default=2000)
+    parser.add_argument('--hold', type=float, default=20, help='segundos con los streams abiertos')
+    parser.add_argument('--timeout', type=int, default=5, help='timeout de gunicorn')
+    parser.add_argument('--worker-class', default='gevent')
+    args = parser.parse_args()
+
+    os.environ['AUTH_SIGNING_KEYS'] = SIGNING_KEYS
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    tmpdir = tempfile.mkdtemp()
+    database = os.path.join(tmpdir, 'bench.db')
+    create_database(database)
+    token = issue_token(database)
+
+    port = free_port()
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{database}',
+               CATALOG_SNAPSHOT_DIR=tempfile.mkdtemp(dir=tmpdir),
+               WEB_CONCURRENCY='1',
+               GUNICORN_WORKER_CLASS=args.worker_class,
+               GUNICORN_WORKER_CONNECTIONS=str(args.streams + 100),
+               GUNICORN_TIMEOUT=str(args.timeout),
+               PORT=str(port))
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                               cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while get(f'http://127.0.0.1:{port}/people')[0] != 200:
+            if process.poll() is not None:
+                raise RuntimeError('gunicorn exited during start-up')
+            time.sleep(0.05)
+        streams, latencies, failures = asyncio.run(
+            hold_streams(port, token, args.streams, args.hold))
+        rss = sum(memory_kb(pid)[0] for pid in worker_pids(process.pid)) / 1024
+    finally:
+        process.terminate()
+        process.wait()
+
+    connected = sum(s.status == 200 for s in streams)
+    alive = sum(s.status == 200 and not s.closed for s in streams)
+    kept = sum(s.keepalives > 0 and not s.closed for s in streams)
+    print(f'worker_class={args.worker_class}  streams={args.streams}  '
+          f'hold={args.hold:.0f}s  gunicorn timeout={args.timeout}s')
+    print(f'  connected (200): {connected}  still open: {alive}  with keep-alive: {kept}')
+    if latencies:
+        print(f'  GET /people while holding: p50={statistics.median(latencies):.1f} ms  '
+              f'max={max(latencies):.1f} ms  failed={failures}')
+    else:
+        print(f'  GET /people while holding: all {failures} requests failed')
+    print(f'  worker RSS: {rss:.1f} MB')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
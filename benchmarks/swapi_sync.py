@@ -0,0 +1,157 @@
+# benchmarks/swapi_sync.py
+#
+# Páginas por segundo de `flask sync-swapi` contra un stub local de
+# SWAPI (sin red): un ThreadingHTTPServer que sirve /people y /planets
+# paginados como swapi.dev, con ETag / Last-Modified, latencia por
+# petición y una fracción de respuestas 503 para ejercitar los reintentos.
+# Cada concurrencia se mide sobre una BD SQLite temporal nueva y al final
+# se repite la última sincronización, que debe llegar entera como 304.
+#
+#   python -m benchmarks.swapi_sync
+#   python -m benchmarks.swapi_sync --people 5000 --latency 0.05 --fail-rate 0.1
+#
+# Opciones: --planets N, --page-size N, --concurrency 1 8 32
+
+import os
+import json
+import random
+import argparse
+import tempfile
+import threading
+import hashlib
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+LAST_MODIFIED = formatdate(0, usegmt=True)
+
+
+def make_collections(people, planets):
+    return {
+        'people': [{'name': f'Person {i}', 'birth_year': f'{i % 100}BBY',
+                    'gender': random.choice(['male', 'female', 'n/a']),
+                    'eye_color': random.choice(['blue', 'brown', 'yellow'])}
+                   for i in range(1, people + 1)],
+        'planets': [{'name': f'Planet {i}', 'climate': random.choice(['arid', 'temperate', 'frozen']),
+                     'terrain': random.choice(['desert', 'grasslands, mountains']),
+                     'population': random.choice(['unknown', str(random.randrange(10 ** 12))])}
+                    for i in range(1, planets + 1)],
+    }
+
+
+class StubSwapi(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, collections, page_size=10, latency=0.0, fail_rate=0.0):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.collections = collections
+        self.page_size = page_size
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.base_url = f'http://127.0.0.1:{self.server_address[1]}/api'
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def page(self, resource, page):
+        items = self.collections[resource]
+        start = (page - 1) * self.page_size
+        if page < 1 or (start >= len(items) and page != 1):
+            return None
+        more = start + self.page_size < len(items)
+        return json.dumps({
+            'count': len(items),
+            'next': f'{self.base_url}/{resource}/?page={page + 1}' if more else None,
+            'previous': f'{self.base_url}/{resource}/?page={page - 1}' if page > 1 else None,
+            'results': items[start:start + self.page_size],
+        }).encode('utf-8')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if server.latency:
+            threading.Event().wait(server.latency)
+        if random.random() < server.fail_rate:
+            return self.reply(503, b'', {'Retry-After': '0'})
+
+        url = urlsplit(self.path)
+        resource = url.path.strip('/').split('/')[-1]
+        body = None
+        if resource in server.collections:
+            body = server.page(resource, int(parse_qs(url.query).get('page', ['1'])[0]))
+        if body is None:
+            return self.reply(404, b'{"detail": "Not found"}')
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            return self.reply(304, b'', {'ETag': etag})
+        self.reply(200, body, {'ETag': etag, 'Last-Modified': LAST_MODIFIED})
+
+    def reply(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_sync(base_url, db_path, state_path, concurrency, full):
+    from src.app import create_app
+    from src.models import db
+    from src.swapi_sync import sync_swapi
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'})
+    with app.app_context():
+        db.create_all()
+        return sync_swapi(base_url, state_path, full=full, concurrency=concurrency)
+
+
+def describe(label, report):
+    totals = report['totals']
+    people, planets = report['people'], report['planets']
+    print(f"{label:<22} {totals['pages']:>5} pages {totals['seconds']:>7.2f}s "
+          f"{totals['pages_per_second']:>8.1f} pages/s  {totals['retries']:>4} retries  "
+          f"304: {people['not_modified'] + planets['not_modified']:>5}  "
+          f"created: {people['created'] + planets['created']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--people', type=int, default=2000)
+    parser.add_argument('--planets', type=int, default=500)
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.02, help='segundos por petición')
+    parser.add_argument('--fail-rate', type=float, default=0.05, help='fracción de 503')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args()
+
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    os.environ.setdefault('AUTH_SIGNING_KEYS', 'bench:benchmark-signing-key')
+    stub = StubSwapi(make_collections(args.people, args.planets), page_size=args.page_size,
+                     latency=args.latency, fail_rate=args.fail_rate)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for concurrency in args.concurrency:
+            db_path = os.path.join(tmp, f'sync-{concurrency}.db')
+            state_path = os.path.join(tmp, f'sync-{concurrency}.json')
+            describe(f'concurrency={concurrency}',
+                     run_sync(stub.base_url, db_path, state_path, concurrency, full=True))
+        describe(f'concurrency={concurrency} again',
+                 run_sync(stub.base_url, db_path, state_path, concurrency, full=False))
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# gunicorn.conf.py
+#
+#   gunicorn -c gunicorn.conf.py src.wsgi:application
+#
+# El puerto ($PORT) y el número de workers ($WEB_CONCURRENCY) los toma
+# gunicorn del entorno. GUNICORN_PRELOAD=0 desactiva la precarga (cada
+# worker importa y calienta la app por su cuenta, como antes).
+#
+# Workers gevent: cada conexión es un greenlet, así que un cliente de
+# GET /stream ocioso no ocupa un worker ni un hilo. Con workers
+# asíncronos `timeout` es solo el latido del worker (no limita lo que
+# dura una petición) y los streams viven lo que quiera el cliente; el
+# keep-alive SSE cada 15 s mantiene abiertos los proxies intermedios.
+
+import gc
+import os
+
+wsgi_app = 'src.wsgi:application'
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+# Conexiones simultáneas por worker (streams incluidos)
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+# Por encima del idle timeout típico de un balanceador (60 s)
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 75))
+
+if worker_class == 'gevent':
+    # Con precarga la app (y sus Lock/Condition) se crea en el master,
+    # antes de que el worker parchee la librería estándar: se parchea
+    # aquí, antes de importar nada más. psycogreen hace que las consultas
+    # a Postgres cedan el control en vez de bloquear el worker entero.
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+
+def when_ready(server):
+    # Master, con la app ya importada y antes de crear ningún worker
+    if server.cfg.preload_app:
+        from src.warmup import warm_up
+        warm_up(server.app.wsgi())
+        # Lo cargado hasta aquí queda fuera del GC: así el recolector de
+        # cada worker no escribe en esas páginas y siguen compartidas
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from src.warmup import start_worker
+        start_worker(server.app.wsgi())
+
+
+def post_worker_init(worker):
+    # Sin precarga la app se importa en cada worker: se calienta aquí
+    if not worker.cfg.preload_app:
+        from src.warmup import warm_up, start_worker
+        warm_up(worker.wsgi)
+        start_worker(worker.wsgi)
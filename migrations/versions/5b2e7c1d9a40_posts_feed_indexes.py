@@ -0,0 +1,28 @@
+"""posts feed indexes
+
+Revision ID: 5b2e7c1d9a40
+Revises: 003417a1b0f1
+Create Date: 2026-10-18 23:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e7c1d9a40'
+down_revision = '003417a1b0f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.create_index('ix_posts_user_id_created_at_id', ['user_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_posts_created_at_id', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_index('ix_posts_created_at_id')
+        batch_op.drop_index('ix_posts_user_id_created_at_id')
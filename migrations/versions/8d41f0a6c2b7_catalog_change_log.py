@@ -0,0 +1,55 @@
+"""catalog change log
+
+Revision ID: 8d41f0a6c2b7
+Revises: 5b2e7c1d9a40
+Create Date: 2026-10-18 23:55:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41f0a6c2b7'
+down_revision = '5b2e7c1d9a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_changes',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('operation', sa.String(length=10), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('seq'),
+    sqlite_autoincrement=True
+    )
+    with op.batch_alter_table('catalog_changes', schema=None) as batch_op:
+        batch_op.create_index('ix_catalog_changes_entity', ['entity_type', 'entity_id', 'seq'], unique=False)
+
+    op.create_table('catalog_change_horizon',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Las filas que ya existían entran en el log como inserts, para que
+    # un cliente que empieza con since=0 reciba el catálogo completo
+    op.execute(
+        "INSERT INTO catalog_changes (entity_type, entity_id, operation, changed_at) "
+        "SELECT 'people', id, 'insert', CURRENT_TIMESTAMP FROM people ORDER BY id"
+    )
+    op.execute(
+        "INSERT INTO catalog_changes (entity_type, entity_id, operation, changed_at) "
+        "SELECT 'planets', id, 'insert', CURRENT_TIMESTAMP FROM planets ORDER BY id"
+    )
+
+
+def downgrade():
+    op.drop_table('catalog_change_horizon')
+    with op.batch_alter_table('catalog_changes', schema=None) as batch_op:
+        batch_op.drop_index('ix_catalog_changes_entity')
+
+    op.drop_table('catalog_changes')
@@ -0,0 +1,32 @@
+"""planet population bigint
+
+Revision ID: a91d3f5c7e20
+Revises: e7a2c4b91f06
+Create Date: 2026-10-19 01:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a91d3f5c7e20'
+down_revision = 'e7a2c4b91f06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('planets', schema=None) as batch_op:
+        batch_op.alter_column('population',
+               existing_type=sa.Integer(),
+               type_=sa.BigInteger(),
+               existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('planets', schema=None) as batch_op:
+        batch_op.alter_column('population',
+               existing_type=sa.BigInteger(),
+               type_=sa.Integer(),
+               existing_nullable=True)
@@ -0,0 +1,36 @@
+"""favorites indexes
+
+Revision ID: c3a9e5d2f718
+Revises: 8d41f0a6c2b7
+Create Date: 2026-10-19 00:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a9e5d2f718'
+down_revision = '8d41f0a6c2b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('favorite_characters', schema=None) as batch_op:
+        batch_op.create_index('ix_favorite_characters_person_id', ['person_id'], unique=False)
+        batch_op.create_index('ix_favorite_characters_user_id_person_id', ['user_id', 'person_id'], unique=False)
+
+    with op.batch_alter_table('favorite_planets', schema=None) as batch_op:
+        batch_op.create_index('ix_favorite_planets_planet_id', ['planet_id'], unique=False)
+        batch_op.create_index('ix_favorite_planets_user_id_planet_id', ['user_id', 'planet_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('favorite_planets', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorite_planets_user_id_planet_id')
+        batch_op.drop_index('ix_favorite_planets_planet_id')
+
+    with op.batch_alter_table('favorite_characters', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorite_characters_user_id_person_id')
+        batch_op.drop_index('ix_favorite_characters_person_id')
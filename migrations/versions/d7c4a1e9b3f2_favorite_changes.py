@@ -0,0 +1,35 @@
+"""favorite changes queue
+
+Revision ID: d7c4a1e9b3f2
+Revises: b52e8f0d4c17
+Create Date: 2026-10-19 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7c4a1e9b3f2'
+down_revision = 'b52e8f0d4c17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('favorite_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('item_id', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('favorite_changes', schema=None) as batch_op:
+        batch_op.create_index('ix_favorite_changes_kind_id', ['kind', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('favorite_changes', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorite_changes_kind_id')
+
+    op.drop_table('favorite_changes')
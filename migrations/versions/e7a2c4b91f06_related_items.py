@@ -0,0 +1,31 @@
+"""related items
+
+Revision ID: e7a2c4b91f06
+Revises: c3a9e5d2f718
+Create Date: 2026-10-19 01:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2c4b91f06'
+down_revision = 'c3a9e5d2f718'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('related_items',
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('related_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'item_id', 'rank')
+    )
+
+
+def downgrade():
+    op.drop_table('related_items')
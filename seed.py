@@ -2,6 +2,7 @@
 
 from src.app import create_app
 from src.models import db, User, Person, Planet
+from src.passwords import hash_password
 
 def run_seed():
     app = create_app()
@@ -14,7 +15,7 @@ def run_seed():
         u = User(
             username='luke_skywalker',
             email='luke@tatooine.com',
-            password='secreto',      # En un caso real lo hashearías
+            password=hash_password('secreto'),
             first_name='Luke',
             last_name='Skywalker'
         )
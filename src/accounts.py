@@ -0,0 +1,228 @@
+# src/accounts.py
+
+import os
+import atexit
+
+from flask import request, jsonify, current_app
+from flasgger import swag_from
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from src.models import db, User
+from src.auth import get_signer
+from src.passwords import HasherPool, HasherBusy, is_hashed, DUMMY_HASH
+from src.warmup import on_worker_start
+
+# ----------------------------------------------------------------
+# Registro y login. El hash/verificación de la contraseña se delega
+# al HasherPool (ver passwords.py) para no bloquear el worker.
+# ----------------------------------------------------------------
+
+MIN_PASSWORD_LENGTH = 8
+
+
+def get_hasher():
+    return current_app.extensions['password_hasher']
+
+
+def _busy_response():
+    response = jsonify({'error': 'Authentication service is busy, retry later'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+def _token_response(user, status):
+    signer = get_signer()
+    return jsonify({
+        'user_id': user.id,
+        'token': signer.issue(user.id),
+        'expires_in': signer.ttl
+    }), status
+
+
+def setup_accounts(app):
+    hasher = HasherPool(
+        workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+        max_pending=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 8)),
+        timeout=float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))
+    )
+    app.extensions['password_hasher'] = hasher
+    atexit.register(hasher.shutdown)
+    on_worker_start(app, hasher.warm)
+
+    @app.route('/register', methods=['POST'])
+    @swag_from({
+        'tags': ['auth'],
+        'summary': 'Registrar un usuario nuevo',
+        'parameters': [
+            {
+                'name': 'body',
+                'in': 'body',
+                'required': True,
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'username':   {'type': 'string', 'example': 'leia_organa'},
+                        'email':      {'type': 'string', 'example': 'leia@alderaan.com'},
+                        'password':   {'type': 'string', 'example': 'help-me-obi-wan'},
+                        'first_name': {'type': 'string', 'example': 'Leia'},
+                        'last_name':  {'type': 'string', 'example': 'Organa'}
+                    }
+                }
+            }
+        ],
+        'responses': {
+            201: {
+                'description': 'Usuario creado; incluye un token bearer',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'user_id':    {'type': 'integer', 'example': 2},
+                        'token':      {'type': 'string',  'example': 'k1.MjoxNzAwMDAwMDAw.c2ln'},
+                        'expires_in': {'type': 'integer', 'example': 3600}
+                    }
+                }
+            },
+            400: {
+                'description': 'Faltan campos o la contraseña es demasiado corta',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'username, email and password are required'}
+                    }
+                }
+            },
+            409: {
+                'description': 'El username o el email ya existen',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Username or email already registered'}
+                    }
+                }
+            },
+            503: {
+                'description': 'El servicio de hashing está saturado',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Authentication service is busy, retry later'}
+                    }
+                }
+            }
+        }
+    })
+    def register():
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Body must be a JSON object'}), 400
+        username = data.get('username')
+        email = data.get('email')
+        password = data.get('password')
+        if not all(isinstance(v, str) and v for v in (username, email, password)):
+            return jsonify({'error': 'username, email and password are required'}), 400
+        if len(password) < MIN_PASSWORD_LENGTH:
+            return jsonify({'error': f'Password must have at least {MIN_PASSWORD_LENGTH} characters'}), 400
+        first_name, last_name = data.get('first_name'), data.get('last_name')
+        if not all(v is None or isinstance(v, str) for v in (first_name, last_name)):
+            return jsonify({'error': 'first_name and last_name must be strings'}), 400
+
+        # Comprobación barata antes de gastar un hash
+        if User.query.filter(or_(User.username == username, User.email == email)).first():
+            return jsonify({'error': 'Username or email already registered'}), 409
+
+        try:
+            password_hash = get_hasher().hash(password)
+        except HasherBusy:
+            return _busy_response()
+
+        user = User(
+            username=username,
+            email=email,
+            password=password_hash,
+            first_name=first_name,
+            last_name=last_name
+        )
+        db.session.add(user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'Username or email already registered'}), 409
+        return _token_response(user, 201)
+
+    @app.route('/login', methods=['POST'])
+    @swag_from({
+        'tags': ['auth'],
+        'summary': 'Iniciar sesión y obtener un token bearer',
+        'parameters': [
+            {
+                'name': 'body',
+                'in': 'body',
+                'required': True,
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'username': {'type': 'string', 'example': 'luke_skywalker'},
+                        'password': {'type': 'string', 'example': 'secreto'}
+                    }
+                }
+            }
+        ],
+        'responses': {
+            200: {
+                'description': 'Credenciales correctas',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'user_id':    {'type': 'integer', 'example': 1},
+                        'token':      {'type': 'string',  'example': 'k1.MToxNzAwMDAwMDAw.c2ln'},
+                        'expires_in': {'type': 'integer', 'example': 3600}
+                    }
+                }
+            },
+            401: {
+                'description': 'Usuario o contraseña incorrectos',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Invalid credentials'}
+                    }
+                }
+            },
+            503: {
+                'description': 'El servicio de hashing está saturado',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Authentication service is busy, retry later'}
+                    }
+                }
+            }
+        }
+    })
+    def login():
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Invalid credentials'}), 401
+        login_name = data.get('username') or data.get('email')
+        password = data.get('password')
+        if not isinstance(login_name, str) or not isinstance(password, str):
+            return jsonify({'error': 'Invalid credentials'}), 401
+
+        user = User.query.filter(or_(User.username == login_name, User.email == login_name)).first()
+        try:
+            valid = get_hasher().verify(password, user.password if user else DUMMY_HASH)
+        except HasherBusy:
+            return _busy_response()
+        if not valid or not user:
+            return jsonify({'error': 'Invalid credentials'}), 401
+
+        if not is_hashed(user.password):
+            # Migración perezosa de contraseñas antiguas en texto plano;
+            # si el pool está lleno se reintenta en el siguiente login
+            try:
+                user.password = get_hasher().hash(password)
+                db.session.commit()
+            except HasherBusy:
+                pass
+        return _token_response(user, 200)
@@ -1,16 +1,309 @@
 import os
-from flask_admin import Admin
-from models import db, User
+import hmac
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import flash, request, Response
+from flask_admin import Admin, AdminIndexView
+from flask_admin.actions import action
 from flask_admin.contrib.sqla import ModelView
+from flask_admin.contrib.sqla.filters import FilterEqual, IntEqualFilter
+from werkzeug.exceptions import ServiceUnavailable
+from sqlalchemy import select, insert, delete, func, literal, text
+from src.models import db, User, Person, Planet, Post, FavoritePlanet, FavoriteCharacter, CatalogChange
+from src.changes import lock_change_log, mark_catalog_changed
+from src.favorites import get_favorite_shards, remove_item_favorites, remove_user_favorites
+from src.passwords import HasherBusy, is_hashed
+from src.accounts import get_hasher
+
+# ----------------------------------------------------------------
+# Acceso: HTTP Basic con una credencial propia del panel
+# (ADMIN_USERNAME / ADMIN_PASSWORD), independiente de los tokens de la
+# API. Sin ADMIN_PASSWORD el panel no se registra.
+#
+# Vistas de flask-admin preparadas para tablas grandes:
+#  - número de filas estimado (sin COUNT(*) en cada carga de página)
+#  - paginación por keyset sobre la PK cuando se navega página a página
+#  - filtros solo de igualdad y sobre columnas indexadas
+#  - acciones masivas como una única sentencia set-based
+# ----------------------------------------------------------------
+
+COUNT_CACHE_SECONDS = 60
+MAX_PAGE_BOUNDARIES = 1024
+
+
+def estimate_count(model):
+    """
+    Estimación barata del número de filas:
+      PostgreSQL -> pg_class.reltuples (lo mantiene ANALYZE/autovacuum)
+      MySQL      -> information_schema.tables.table_rows
+      otros      -> MAX(pk), una sola búsqueda en el índice (cota superior)
+    """
+    table = model.__table__
+    dialect = db.engine.dialect.name
+    estimate = None
+    if dialect == 'postgresql':
+        estimate = db.session.execute(
+            text('SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)'),
+            {'table': table.name}
+        ).scalar()
+    elif dialect in ('mysql', 'mariadb'):
+        estimate = db.session.execute(
+            text('SELECT table_rows FROM information_schema.tables '
+                 'WHERE table_schema = DATABASE() AND table_name = :table'),
+            {'table': table.name}
+        ).scalar()
+    if estimate is None or estimate < 0:
+        pk = list(table.primary_key.columns)[0]
+        estimate = db.session.execute(select(func.max(pk))).scalar() or 0
+    return int(estimate)
+
+
+class AdminAccessMixin:
+    """is_accessible / inaccessible_callback compartidos por todas las vistas del panel."""
+
+    def is_accessible(self):
+        credentials = self.admin.app.extensions['admin_credentials']
+        auth = request.authorization
+        if auth is None or auth.type != 'basic':
+            return False
+        # Las dos comparaciones siempre: no filtra por tiempo cuál falló
+        user_ok = hmac.compare_digest((auth.username or '').encode('utf-8'), credentials[0])
+        password_ok = hmac.compare_digest((auth.password or '').encode('utf-8'), credentials[1])
+        return user_ok and password_ok
+
+    def inaccessible_callback(self, name, **kwargs):
+        return Response('Admin credentials required', 401,
+                        {'WWW-Authenticate': 'Basic realm="admin"'})
+
+
+class ProtectedIndexView(AdminAccessMixin, AdminIndexView):
+    pass
+
+
+class ScalableModelView(AdminAccessMixin, ModelView):
+    page_size = 50
+    can_set_page_size = False
+    # Sin búsquedas LIKE '%...%': en tablas grandes siempre son un full scan
+    column_searchable_list = ()
+    column_default_sort = ('id', True)
+    # Sin conteo exacto: con filtros se usa el paginador simple (anterior/siguiente)
+    simple_list_pager = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._count_cache = (0.0, None)
+        # (búsqueda, filtros, orden, página) -> última PK de esa página
+        self._page_boundaries = OrderedDict()
+        self._boundaries_lock = threading.Lock()
+
+    def _estimated_count(self):
+        cached_at, count = self._count_cache
+        if count is None or time.monotonic() - cached_at > COUNT_CACHE_SECONDS:
+            count = estimate_count(self.model)
+            self._count_cache = (time.monotonic(), count)
+        return count
+
+    def _remember_boundary(self, key, pk_value):
+        with self._boundaries_lock:
+            self._page_boundaries[key] = pk_value
+            self._page_boundaries.move_to_end(key)
+            if len(self._page_boundaries) > MAX_PAGE_BOUNDARIES:
+                self._page_boundaries.popitem(last=False)
+
+    def get_list(self, page, sort_column, sort_desc, search, filters,
+                 execute=True, page_size=None):
+        """
+        Igual que ModelView.get_list (flask-admin 1.6) pero sin COUNT(*) y,
+        si se ordena por la PK y conocemos la última fila de la página
+        anterior, con `WHERE pk > :ultima` en lugar de OFFSET.
+        """
+        joins = {}
+        count_joins = {}
+        query = self.get_query()
+        if self._search_supported and search:
+            query, _, joins, count_joins = self._apply_search(query, None, joins, count_joins, search)
+        if filters and self._filters:
+            query, _, joins, count_joins = self._apply_filters(query, None, joins, count_joins, filters)
+
+        count = None if (search or filters) else self._estimated_count()
+
+        pk = getattr(self.model, self._primary_key)
+        if sort_column is None and self.column_default_sort:
+            sort_column, sort_desc = self.column_default_sort
+        by_pk = sort_column == self._primary_key
+        page_size = page_size or self.page_size
+        key = (search, tuple(tuple(f) for f in (filters or ())), bool(sort_desc))
+
+        boundary = None
+        if by_pk and page:
+            with self._boundaries_lock:
+                boundary = self._page_boundaries.get(key + (page - 1,))
+        if boundary is not None:
+            query = query.filter(pk < boundary if sort_desc else pk > boundary)
+
+        query, joins = self._apply_sorting(query, joins, sort_column, sort_desc)
+        query = query.limit(page_size)
+        if page and boundary is None:
+            query = query.offset(page * page_size)
+
+        if not execute:
+            return count, query
+
+        rows = query.all()
+        if by_pk and rows:
+            self._remember_boundary(key + (page or 0,), getattr(rows[-1], self._primary_key))
+        return count, rows
+
+    # ------------------------ acciones masivas ------------------------
+
+    def bulk_delete(self, ids):
+        """DELETE ... WHERE pk IN (...). Las subclases borran antes sus dependencias."""
+        pk = getattr(self.model, self._primary_key)
+        return db.session.execute(delete(self.model).where(pk.in_(ids))).rowcount
+
+    @action('delete', 'Delete', 'Are you sure you want to delete selected records?')
+    def action_delete(self, ids):
+        ids = [int(pk) for pk in ids]
+        try:
+            count = self.bulk_delete(ids)
+            db.session.commit()
+            flash(f'{count} records were successfully deleted.', 'success')
+        except Exception as ex:
+            db.session.rollback()
+            if not self.handle_view_exception(ex):
+                raise
+            flash(f'Failed to delete records. {ex}', 'error')
+
+
+class CatalogModelView(ScalableModelView):
+    """Person/Planet: el borrado masivo también escribe las tombstones del change log."""
+    entity_type = None
+    favorites_kind = None
+    column_sortable_list = ('id', 'name')
+
+    def bulk_delete(self, ids):
+        remove_item_favorites(self.favorites_kind, ids)
+        # Un DELETE con Core no pasa por el after_flush de changes.py: registramos
+        # las tombstones con un INSERT ... SELECT en la misma transacción
+        lock_change_log(db.session)
+        db.session.execute(
+            insert(CatalogChange).from_select(
+                ['entity_type', 'entity_id', 'operation', 'changed_at'],
+                select(literal(self.entity_type), self.model.id, literal('delete'),
+                       literal(datetime.utcnow(), db.DateTime))
+                .where(self.model.id.in_(ids))
+                .order_by(self.model.id)
+            )
+        )
+        mark_catalog_changed(db.session)
+        return super().bulk_delete(ids)
+
+    def on_model_delete(self, model):
+        # Sin shards ya se encarga la relación `fans` al borrar la fila
+        if get_favorite_shards() is not None:
+            remove_item_favorites(self.favorites_kind, [model.id])
+
+    @action('clear_favorites', 'Clear favorites',
+            'Remove the selected records from every user\'s favorites?')
+    def action_clear_favorites(self, ids):
+        ids = [int(pk) for pk in ids]
+        count = remove_item_favorites(self.favorites_kind, ids)
+        db.session.commit()
+        flash(f'{count} favorites were removed.', 'success')
+
+
+class PersonView(CatalogModelView):
+    entity_type = 'people'
+    favorites_kind = 'people'
+    column_list = ('id', 'name', 'birth_year', 'gender', 'eye_color')
+    column_filters = (FilterEqual(Person.name, 'Name'),)
+    form_excluded_columns = ('fans',)
+
+
+class PlanetView(CatalogModelView):
+    entity_type = 'planets'
+    favorites_kind = 'planet'
+    column_list = ('id', 'name', 'climate', 'terrain', 'population')
+    column_filters = (FilterEqual(Planet.name, 'Name'),)
+    form_excluded_columns = ('fans',)
+
+
+class UserView(ScalableModelView):
+    column_list = ('id', 'username', 'email', 'first_name', 'last_name', 'joined_at')
+    column_sortable_list = ('id', 'username', 'email')
+    column_filters = (FilterEqual(User.username, 'Username'), FilterEqual(User.email, 'Email'))
+    form_excluded_columns = ('posts', 'favorite_planets', 'favorite_characters')
+
+    def on_model_change(self, form, model, is_created):
+        # Una contraseña escrita en el formulario nunca se guarda en claro.
+        # Se hashea en el mismo pool que /register y /login: con su límite
+        # de trabajos en vuelo y HasherBusy si está lleno
+        if not is_hashed(model.password):
+            model.password = get_hasher().hash(model.password)
+
+    def handle_view_exception(self, exc):
+        if isinstance(exc, HasherBusy):
+            # Mismo back-pressure que la API: 503 con Retry-After
+            self.session.rollback()
+            raise ServiceUnavailable('Password hashing is busy, retry later', retry_after=1)
+        return super().handle_view_exception(exc)
+
+    def bulk_delete(self, ids):
+        remove_user_favorites(ids)
+        db.session.execute(delete(Post.__table__).where(Post.__table__.c.user_id.in_(ids)))
+        return super().bulk_delete(ids)
+
+    def on_model_delete(self, model):
+        if get_favorite_shards() is not None:
+            remove_user_favorites([model.id])
+
+
+class PostView(ScalableModelView):
+    column_list = ('id', 'title', 'user_id', 'created_at')
+    column_sortable_list = ('id',)
+    column_filters = (IntEqualFilter(Post.user_id, 'User ID'),)
+
+
+class FavoritePlanetView(ScalableModelView):
+    column_list = ('id', 'user_id', 'planet_id', 'created_at')
+    column_sortable_list = ('id',)
+    column_filters = (IntEqualFilter(FavoritePlanet.user_id, 'User ID'),
+                      IntEqualFilter(FavoritePlanet.planet_id, 'Planet ID'))
+    form_columns = ('user_id', 'planet_id')
+
+
+class FavoriteCharacterView(ScalableModelView):
+    column_list = ('id', 'user_id', 'person_id', 'created_at')
+    column_sortable_list = ('id',)
+    column_filters = (IntEqualFilter(FavoriteCharacter.user_id, 'User ID'),
+                      IntEqualFilter(FavoriteCharacter.person_id, 'Person ID'))
+    form_columns = ('user_id', 'person_id')
+
 
 def setup_admin(app):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
+    password = os.environ.get('ADMIN_PASSWORD')
+    if not password:
+        # Desactivado por defecto: sin credencial no hay panel
+        return
+    app.extensions['admin_credentials'] = (os.environ.get('ADMIN_USERNAME', 'admin').encode('utf-8'),
+                                           password.encode('utf-8'))
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
-    admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
+    admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3', index_view=ProtectedIndexView())
 
-    
     # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(User, db.session))
+    admin.add_view(UserView(User, db.session))
+    admin.add_view(PersonView(Person, db.session))
+    admin.add_view(PlanetView(Planet, db.session))
+    admin.add_view(PostView(Post, db.session))
+    # Con FAVORITES_SHARDS los favoritos viven en los shards y las tablas de
+    # la BD principal se quedan obsoletas: no las mostramos para no editarlas
+    if app.extensions.get('favorite_shards') is None:
+        admin.add_view(FavoritePlanetView(FavoritePlanet, db.session, name='Favorite planets'))
+        admin.add_view(FavoriteCharacterView(FavoriteCharacter, db.session, name='Favorite characters'))
 
     # You can duplicate that line to add mew models
-    # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
+    # admin.add_view(YourModelView(YourModelName, db.session))
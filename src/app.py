@@ -1,23 +1,45 @@
 # src/app.py
 
-from flask import Flask, request, jsonify, redirect, url_for
+import os
+
+from flask import Flask, request, jsonify, redirect, url_for, g
 from flask_migrate import Migrate
 from flasgger import Swagger, swag_from
-from src.models import db, User, Person, Planet, favorite_planets, favorite_characters
-
-# ----------------------------------------------------------
-# Usuario “hardcodeado” (mientras no implementemos autenticación)
-CURRENT_USER_ID = 1
-# ----------------------------------------------------------
-
-def create_app():
+from sqlalchemy.exc import IntegrityError
+from src.models import db, User, Person, Planet
+from src.auth import setup_auth, token_required
+from src.accounts import setup_accounts
+from src.posts import setup_posts
+from src.changes import setup_changes
+from src.events import setup_events, publish_event
+from src.snapshots import setup_snapshots, catalog_snapshot, catalog_item
+from src.admin import setup_admin
+from src.favorites import list_favorites, is_favorite, add_favorite, remove_favorite
+from src.batch import setup_batch
+from src.slow_queries import setup_slow_query_log
+from src.profiler import setup_profiler
+from src.related import setup_related
+from src.stats import setup_stats
+from src.autocomplete import setup_autocomplete
+from src.idempotency import setup_idempotency, idempotent
+from src.swapi_sync import setup_swapi_sync
+from src.favorite_shards import setup_favorite_shards
+
+def create_app(config=None):
     app = Flask(__name__)
 
     # ------------------------------------------------------
     # Configuración de la base de datos (SQLite en este ejemplo)
     # ------------------------------------------------------
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///starwars_blog_api.db'
+    # En producción (Heroku/Render) la URL de la BD llega en DATABASE_URL
+    db_url = os.environ.get('DATABASE_URL')
+    if db_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace('postgres://', 'postgresql://', 1)
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///starwars_blog_api.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Permite sobrescribir la configuración (p. ej. otra BD en benchmarks)
+    app.config.update(config or {})
 
     # ------------------------------------------------------
     # Plantilla de Swagger/OpenAPI (ahora usando swagger: "2.0")
@@ -36,7 +58,7 @@ def create_app():
                 "url": "https://github.com/4GeeksAcademy"
             }
         },
-        # <-- Declaramos los cuatro tags EN EL ORDEN EXACTO que queremos -->
+        # <-- Declaramos los tags EN EL ORDEN EXACTO que queremos -->
         "tags": [
             {
                 "name": "people",
@@ -50,14 +72,51 @@ def create_app():
                 "name": "users",
                 "description": "Operaciones sobre usuarios y favoritos"
             },
+            {
+                "name": "auth",
+                "description": "Registro e inicio de sesión"
+            },
             {
                 "name": "favorite",
                 "description": "Añadir/Eliminar favoritos"
+            },
+            {
+                "name": "posts",
+                "description": "Posts del blog y feeds paginados"
+            },
+            {
+                "name": "changes",
+                "description": "Cambios del catálogo para sincronización incremental"
+            },
+            {
+                "name": "stream",
+                "description": "Eventos en vivo (Server-Sent Events)"
+            },
+            {
+                "name": "batch",
+                "description": "Varias peticiones GET en un solo round trip"
+            },
+            {
+                "name": "stats",
+                "description": "Estadísticas agregadas del catálogo"
+            },
+            {
+                "name": "autocomplete",
+                "description": "Sugerencias de nombres mientras se escribe"
             }
         ],
         # Servidor base para Swagger
         "schemes": ["http"],
         "basePath": "/",
+        # Autenticación: "Authorization: Bearer <token>"
+        "securityDefinitions": {
+            "Bearer": {
+                "type": "apiKey",
+                "name": "Authorization",
+                "in": "header",
+                "description": "Token firmado: 'Bearer <token>'"
+            }
+        },
     }
 
     # ------------------------------------------------------
@@ -75,6 +134,10 @@ def create_app():
     # ------------------------------------------------------
     db.init_app(app)
     Migrate(app, db)
+    setup_slow_query_log(app)
+    setup_auth(app)
+    setup_idempotency(app)
+    setup_favorite_shards(app)
 
     # ------------------------------------------------------
     # Ruta raíz (“/”) redirige directamente a Swagger UI (/apidocs/)
@@ -110,15 +173,10 @@ def create_app():
             }
         }
     })
+    @catalog_snapshot('people')
     def get_all_people():
         people = Person.query.all()
-        result = [{
-            'id': p.id,
-            'name': p.name,
-            'birth_year': p.birth_year,
-            'gender': p.gender,
-            'eye_color': p.eye_color
-        } for p in people]
+        result = [p.serialize() for p in people]
         return jsonify(result), 200
 
     @app.route('/people/<int:people_id>', methods=['GET'])
@@ -159,18 +217,12 @@ def create_app():
             }
         }
     })
+    @catalog_item('people', 'people_id')
     def get_person(people_id):
         p = Person.query.get(people_id)
         if not p:
             return jsonify({'error': 'Person not found'}), 404
-        data = {
-            'id': p.id,
-            'name': p.name,
-            'birth_year': p.birth_year,
-            'gender': p.gender,
-            'eye_color': p.eye_color
-        }
-        return jsonify(data), 200
+        return jsonify(p.serialize()), 200
 
     # ======================================================
     # 2) BLOQUE “planets” – Operaciones sobre planetas (/planets)
@@ -199,15 +251,10 @@ def create_app():
             }
         }
     })
+    @catalog_snapshot('planets')
     def get_all_planets():
         planets = Planet.query.all()
-        result = [{
-            'id': pl.id,
-            'name': pl.name,
-            'climate': pl.climate,
-            'terrain': pl.terrain,
-            'population': pl.population
-        } for pl in planets]
+        result = [pl.serialize() for pl in planets]
         return jsonify(result), 200
 
     @app.route('/planets/<int:planet_id>', methods=['GET'])
@@ -248,18 +295,12 @@ def create_app():
             }
         }
     })
+    @catalog_item('planets', 'planet_id')
     def get_planet(planet_id):
         pl = Planet.query.get(planet_id)
         if not pl:
             return jsonify({'error': 'Planet not found'}), 404
-        data = {
-            'id': pl.id,
-            'name': pl.name,
-            'climate': pl.climate,
-            'terrain': pl.terrain,
-            'population': pl.population
-        }
-        return jsonify(data), 200
+        return jsonify(pl.serialize()), 200
 
     # ======================================================
     # 3) BLOQUE “users” – Operaciones sobre usuarios (/users)
@@ -305,6 +346,7 @@ def create_app():
     @swag_from({
         'tags': ['users'],
         'summary': 'Listar favoritos del usuario actual',
+        'security': [{'Bearer': []}],
         'responses': {
             200: {
                 'description': 'Favoritos del usuario',
@@ -341,40 +383,24 @@ def create_app():
                     }
                 }
             },
-            404: {
-                'description': 'Usuario no encontrado',
+            401: {
+                'description': 'Token ausente, inválido o expirado',
                 'schema': {
                     'type': 'object',
                     'properties': {
-                        'error': {'type': 'string', 'example': 'Current user not found'}
+                        'error': {'type': 'string', 'example': 'Missing or invalid token'}
                     }
                 }
             }
         }
     })
+    @token_required
     def get_user_favorites():
-        user = User.query.get(CURRENT_USER_ID)
-        if not user:
-            return jsonify({'error': 'Current user not found'}), 404
-
-        fav_planets = [{
-            'id': pl.id,
-            'name': pl.name,
-            'climate': pl.climate,
-            'terrain': pl.terrain,
-            'population': pl.population
-        } for pl in user.favorite_planets]
-
-        fav_people = [{
-            'id': p.id,
-            'name': p.name,
-            'birth_year': p.birth_year,
-            'gender': p.gender,
-            'eye_color': p.eye_color
-        } for p in user.favorite_characters]
+        fav_planets = [pl.serialize() for pl in list_favorites(g.user_id, 'planet')]
+        fav_people = [p.serialize() for p in list_favorites(g.user_id, 'people')]
 
         return jsonify({
-            'user_id': user.id,
+            'user_id': g.user_id,
             'favorite_planets': fav_planets,
             'favorite_characters': fav_people
         }), 200
@@ -387,6 +413,7 @@ def create_app():
     @swag_from({
         'tags': ['favorite'],
         'summary': 'Añadir un planeta a favoritos',
+        'security': [{'Bearer': []}],
         'parameters': [
             {
                 'name': 'planet_id',
@@ -394,6 +421,13 @@ def create_app():
                 'description': 'ID del planeta a agregar a favoritos',
                 'required': True,
                 'type': 'integer'
+            },
+            {
+                'name': 'Idempotency-Key',
+                'in': 'header',
+                'description': 'Clave única del intento; un reintento con la misma clave devuelve la respuesta original',
+                'required': False,
+                'type': 'string'
             }
         ],
         'responses': {
@@ -406,6 +440,15 @@ def create_app():
                     }
                 }
             },
+            401: {
+                'description': 'Token ausente, inválido o expirado',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Missing or invalid token'}
+                    }
+                }
+            },
             404: {
                 'description': 'Usuario o planeta no encontrado',
                 'schema': {
@@ -426,26 +469,32 @@ def create_app():
             }
         }
     })
+    @token_required
+    @idempotent
     def add_favorite_planet(planet_id):
-        user = User.query.get(CURRENT_USER_ID)
-        if not user:
-            return jsonify({'error': 'Current user not found'}), 404
-
         planet = Planet.query.get(planet_id)
         if not planet:
             return jsonify({'error': 'Planet not found'}), 404
 
-        if planet in user.favorite_planets:
+        if is_favorite(g.user_id, 'planet', planet_id):
             return jsonify({'message': 'Planet already in favorites'}), 409
 
-        user.favorite_planets.append(planet)
-        db.session.commit()
+        try:
+            add_favorite(g.user_id, 'planet', planet_id)
+            db.session.commit()
+        except IntegrityError:
+            # El token es válido pero el usuario ya no existe (FK users.id)
+            db.session.rollback()
+            return jsonify({'error': 'Current user not found'}), 404
+        publish_event('favorite_added', {'user_id': g.user_id, 'kind': 'planet', 'item_id': planet_id},
+                      user_id=g.user_id)
         return jsonify({'message': f'Planet {planet.name} added to favorites'}), 201
 
     @app.route('/favorite/planet/<int:planet_id>', methods=['DELETE'])
     @swag_from({
         'tags': ['favorite'],
         'summary': 'Eliminar un planeta de favoritos',
+        'security': [{'Bearer': []}],
         'parameters': [
             {
                 'name': 'planet_id',
@@ -453,6 +502,13 @@ def create_app():
                 'description': 'ID del planeta a eliminar de favoritos',
                 'required': True,
                 'type': 'integer'
+            },
+            {
+                'name': 'Idempotency-Key',
+                'in': 'header',
+                'description': 'Clave única del intento; un reintento con la misma clave devuelve la respuesta original',
+                'required': False,
+                'type': 'string'
             }
         ],
         'responses': {
@@ -465,8 +521,17 @@ def create_app():
                     }
                 }
             },
+            401: {
+                'description': 'Token ausente, inválido o expirado',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Missing or invalid token'}
+                    }
+                }
+            },
             404: {
-                'description': 'Usuario, planeta o favorito no encontrado',
+                'description': 'Planeta o favorito no encontrado',
                 'schema': {
                     'type': 'object',
                     'properties': {
@@ -476,26 +541,26 @@ def create_app():
             }
         }
     })
+    @token_required
+    @idempotent
     def delete_favorite_planet(planet_id):
-        user = User.query.get(CURRENT_USER_ID)
-        if not user:
-            return jsonify({'error': 'Current user not found'}), 404
-
         planet = Planet.query.get(planet_id)
         if not planet:
             return jsonify({'error': 'Planet not found'}), 404
 
-        if planet not in user.favorite_planets:
+        if not remove_favorite(g.user_id, 'planet', planet_id):
             return jsonify({'message': 'Planet not in favorites'}), 404
 
-        user.favorite_planets.remove(planet)
         db.session.commit()
+        publish_event('favorite_removed', {'user_id': g.user_id, 'kind': 'planet', 'item_id': planet_id},
+                      user_id=g.user_id)
         return jsonify({'message': f'Planet {planet.name} removed from favorites'}), 200
 
     @app.route('/favorite/people/<int:people_id>', methods=['POST'])
     @swag_from({
         'tags': ['favorite'],
         'summary': 'Añadir un personaje a favoritos',
+        'security': [{'Bearer': []}],
         'parameters': [
             {
                 'name': 'people_id',
@@ -503,6 +568,13 @@ def create_app():
                 'description': 'ID del personaje a agregar a favoritos',
                 'required': True,
                 'type': 'integer'
+            },
+            {
+                'name': 'Idempotency-Key',
+                'in': 'header',
+                'description': 'Clave única del intento; un reintento con la misma clave devuelve la respuesta original',
+                'required': False,
+                'type': 'string'
             }
         ],
         'responses': {
@@ -515,6 +587,15 @@ def create_app():
                     }
                 }
             },
+            401: {
+                'description': 'Token ausente, inválido o expirado',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Missing or invalid token'}
+                    }
+                }
+            },
             404: {
                 'description': 'Usuario o personaje no encontrado',
                 'schema': {
@@ -535,26 +616,32 @@ def create_app():
             }
         }
     })
+    @token_required
+    @idempotent
     def add_favorite_person(people_id):
-        user = User.query.get(CURRENT_USER_ID)
-        if not user:
-            return jsonify({'error': 'Current user not found'}), 404
-
         person = Person.query.get(people_id)
         if not person:
             return jsonify({'error': 'Person not found'}), 404
 
-        if person in user.favorite_characters:
+        if is_favorite(g.user_id, 'people', people_id):
             return jsonify({'message': 'Person already in favorites'}), 409
 
-        user.favorite_characters.append(person)
-        db.session.commit()
+        try:
+            add_favorite(g.user_id, 'people', people_id)
+            db.session.commit()
+        except IntegrityError:
+            # El token es válido pero el usuario ya no existe (FK users.id)
+            db.session.rollback()
+            return jsonify({'error': 'Current user not found'}), 404
+        publish_event('favorite_added', {'user_id': g.user_id, 'kind': 'people', 'item_id': people_id},
+                      user_id=g.user_id)
         return jsonify({'message': f'Person {person.name} added to favorites'}), 201
 
     @app.route('/favorite/people/<int:people_id>', methods=['DELETE'])
     @swag_from({
         'tags': ['favorite'],
         'summary': 'Eliminar un personaje de favoritos',
+        'security': [{'Bearer': []}],
         'parameters': [
             {
                 'name': 'people_id',
@@ -562,6 +649,13 @@ def create_app():
                 'description': 'ID del personaje a eliminar de favoritos',
                 'required': True,
                 'type': 'integer'
+            },
+            {
+                'name': 'Idempotency-Key',
+                'in': 'header',
+                'description': 'Clave única del intento; un reintento con la misma clave devuelve la respuesta original',
+                'required': False,
+                'type': 'string'
             }
         ],
         'responses': {
@@ -574,8 +668,17 @@ def create_app():
                     }
                 }
             },
+            401: {
+                'description': 'Token ausente, inválido o expirado',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Missing or invalid token'}
+                    }
+                }
+            },
             404: {
-                'description': 'Usuario, personaje o favorito no encontrado',
+                'description': 'Personaje o favorito no encontrado',
                 'schema': {
                     'type': 'object',
                     'properties': {
@@ -585,20 +688,19 @@ def create_app():
             }
         }
     })
+    @token_required
+    @idempotent
     def delete_favorite_person(people_id):
-        user = User.query.get(CURRENT_USER_ID)
-        if not user:
-            return jsonify({'error': 'Current user not found'}), 404
-
         person = Person.query.get(people_id)
         if not person:
             return jsonify({'error': 'Person not found'}), 404
 
-        if person not in user.favorite_characters:
+        if not remove_favorite(g.user_id, 'people', people_id):
             return jsonify({'message': 'Person not in favorites'}), 404
 
-        user.favorite_characters.remove(person)
         db.session.commit()
+        publish_event('favorite_removed', {'user_id': g.user_id, 'kind': 'people', 'item_id': people_id},
+                      user_id=g.user_id)
         return jsonify({'message': f'Person {person.name} removed from favorites'}), 200
 
     # --------------------------------------------------
@@ -608,6 +710,23 @@ def create_app():
     def not_found(error):
         return jsonify({'error': 'Not found'}), 404
 
+    # --------------------------------------------------
+    # Endpoints adicionales (definidos en sus propios módulos)
+    # --------------------------------------------------
+    setup_accounts(app)
+    setup_posts(app)
+    setup_changes(app)
+    setup_events(app)
+    setup_snapshots(app)
+    setup_admin(app)
+    setup_batch(app)
+    setup_related(app)
+    setup_stats(app)
+    setup_autocomplete(app)
+    setup_swapi_sync(app)
+    # Middleware WSGI: el último, para envolver la petición completa
+    setup_profiler(app)
+
     return app
 
 
@@ -0,0 +1,175 @@
+# src/auth.py
+
+import os
+import time
+import hmac
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import click
+from flask import request, jsonify, g, current_app
+
+# ----------------------------------------------------------------
+# Tokens bearer firmados con HMAC-SHA256 y con expiración.
+# Se verifican solo en memoria (sin tabla de sesiones ni lectura de
+# `users`), así que cada petición autenticada no toca la BD.
+#
+# Formato:  <kid>.<payload>.<firma>
+#   kid     -> identificador de la clave usada para firmar (rotación)
+#   payload -> base64url("<user_id>:<exp>")
+#   firma   -> base64url(HMAC(clave, "<kid>.<payload>"))
+# ----------------------------------------------------------------
+
+DEFAULT_TOKEN_TTL = 3600
+DEFAULT_CACHE_SIZE = 4096
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def parse_signing_keys(value):
+    """
+    Lee las claves de `AUTH_SIGNING_KEYS` con el formato
+    "kid1:secreto1,kid0:secreto0". La primera es la activa para firmar;
+    las demás solo se aceptan al verificar (rotación sin cortar sesiones).
+    """
+    keys = OrderedDict()
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        kid, sep, secret = item.partition(':')
+        if not sep or not kid or not secret or '.' in kid:
+            raise ValueError(f"Invalid signing key entry: '{kid}'")
+        keys[kid] = secret.encode('utf-8')
+    return keys
+
+
+class TokenSigner:
+    """
+    Emite y verifica tokens. Los tokens ya verificados se guardan en un
+    LRU pequeño (token -> (kid, user_id, exp)) para no recalcular el HMAC
+    en cada petición; la expiración se sigue comprobando en cada acierto.
+    """
+
+    def __init__(self, keys, ttl=DEFAULT_TOKEN_TTL, cache_size=DEFAULT_CACHE_SIZE):
+        if not keys:
+            raise ValueError('At least one signing key is required')
+        self.keys = OrderedDict(keys)
+        self.active_kid = next(iter(self.keys))
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sign(self, kid, payload):
+        mac = hmac.new(self.keys[kid], f'{kid}.{payload}'.encode('ascii'), hashlib.sha256)
+        return _b64encode(mac.digest())
+
+    def issue(self, user_id, ttl=None):
+        exp = int(time.time()) + (ttl or self.ttl)
+        payload = _b64encode(f'{int(user_id)}:{exp}'.encode('ascii'))
+        return f'{self.active_kid}.{payload}.{self._sign(self.active_kid, payload)}'
+
+    def verify(self, token):
+        """Devuelve el user_id del token, o None si es inválido o expiró."""
+        # Un token válido es ASCII; otro texto rompería el HMAC y compare_digest
+        if not token.isascii():
+            return None
+        now = time.time()
+        with self._lock:
+            hit = self._cache.get(token)
+            if hit is not None:
+                kid, user_id, exp = hit
+                if exp > now and kid in self.keys:
+                    self._cache.move_to_end(token)
+                    return user_id
+                del self._cache[token]
+                return None
+
+        try:
+            kid, payload, signature = token.split('.')
+        except ValueError:
+            return None
+        if kid not in self.keys:
+            return None
+        if not hmac.compare_digest(signature, self._sign(kid, payload)):
+            return None
+        try:
+            user_id, exp = (int(part) for part in _b64decode(payload).decode('ascii').split(':'))
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if exp <= now:
+            return None
+
+        with self._lock:
+            self._cache[token] = (kid, user_id, exp)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return user_id
+
+
+def get_signer():
+    return current_app.extensions['token_signer']
+
+
+def token_required(view=None, *, allow_query=False):
+    """
+    Exige `Authorization: Bearer <token>` y deja el ID del usuario en
+    `g.user_id`. No carga la fila de `User`: el handler solo la consulta
+    si de verdad necesita columnas del usuario.
+
+    Con `allow_query=True` también acepta `?access_token=<token>`, para
+    clientes que no pueden enviar cabeceras (EventSource del navegador).
+    Solo para rutas GET: la URL puede acabar en logs de acceso.
+    """
+    if view is None:
+        return lambda view: token_required(view, allow_query=allow_query)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        user_id = get_signer().verify(token.strip()) if scheme.lower() == 'bearer' else None
+        if user_id is None and allow_query and 'access_token' in request.args:
+            user_id = get_signer().verify(request.args['access_token'])
+        if user_id is None:
+            response = jsonify({'error': 'Missing or invalid token'})
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response, 401
+        g.user_id = user_id
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def setup_auth(app):
+    keys = parse_signing_keys(os.environ.get('AUTH_SIGNING_KEYS'))
+    if not keys:
+        # Sin claves dedicadas reutilizamos la clave de la app (ver admin.py)
+        app_key = os.environ.get('FLASK_APP_KEY')
+        if not app_key:
+            # Con una clave conocida cualquiera podría firmarse tokens:
+            # solo se permite al desarrollar o en pruebas
+            if not (app.debug or app.testing):
+                raise RuntimeError('No token signing key: set AUTH_SIGNING_KEYS or FLASK_APP_KEY')
+            app_key = 'sample key'
+        keys = {'default': app_key.encode('utf-8')}
+    app.extensions['token_signer'] = TokenSigner(
+        keys,
+        ttl=int(os.environ.get('AUTH_TOKEN_TTL', DEFAULT_TOKEN_TTL)),
+        cache_size=int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+    )
+
+    @app.cli.command('issue-token')
+    @click.argument('user_id', type=int)
+    @click.option('--ttl', type=int, default=None, help='Vida del token en segundos')
+    def issue_token_command(user_id, ttl):
+        """Emite un token bearer para USER_ID (útil para pruebas y scripts)."""
+        click.echo(get_signer().issue(user_id, ttl=ttl))
@@ -0,0 +1,161 @@
+# src/batch.py
+
+from flask import request, jsonify
+from flasgger import swag_from
+from werkzeug.exceptions import HTTPException
+from src.models import Person, Planet
+from src.snapshots import get_snapshot_store
+
+# ----------------------------------------------------------------
+# POST /batch – multiplexa varios GET en un único round trip.
+# Cada sub-petición se despacha por la tabla de rutas de la app
+# (sin HTTP), compartiendo la misma sesión y conexión de BD.
+# ----------------------------------------------------------------
+
+MAX_BATCH_SIZE = 50
+
+# Endpoints de detalle cuyos lookups se agrupan en una sola consulta IN:
+# endpoint -> (modelo, nombre del argumento de la URL)
+COALESCED_ENDPOINTS = {
+    'get_person': (Person, 'people_id'),
+    'get_planet': (Planet, 'planet_id'),
+}
+
+
+def _prefetch(app, paths):
+    """
+    Agrupa los lookups por ID del mismo modelo y los carga con un único
+    `WHERE id IN (...)`. Las filas quedan en el identity map de la sesión,
+    así que el `Model.query.get(id)` de cada handler no vuelve a la BD.
+    Con un snapshot publicado los detalles salen del segmento mmap
+    (@catalog_item) sin llegar al handler: no se precarga nada.
+    """
+    if get_snapshot_store().published_version() is not None:
+        return []
+    adapter = app.url_map.bind('')
+    ids_by_model = {}
+    for path in paths:
+        try:
+            endpoint, args = adapter.match(path.split('?', 1)[0], method='GET')
+        except HTTPException:
+            continue
+        if endpoint in COALESCED_ENDPOINTS:
+            model, arg = COALESCED_ENDPOINTS[endpoint]
+            ids_by_model.setdefault(model, set()).add(args[arg])
+
+    # Guardamos las instancias para que no se recolecten antes de usarse
+    loaded = []
+    for model, ids in ids_by_model.items():
+        loaded.extend(model.query.filter(model.id.in_(ids)).all())
+    return loaded
+
+
+def _is_get(sub):
+    return (isinstance(sub, dict) and isinstance(sub.get('path'), str)
+            and sub['path'].startswith('/')
+            and str(sub.get('method', 'GET')).upper() == 'GET')
+
+
+def _dispatch(app, path, headers):
+    """Ejecuta una sub-petición GET por el pipeline normal de Flask."""
+    with app.test_request_context(path, method='GET', headers=headers):
+        response = app.full_dispatch_request()
+    # Los listados servidos desde snapshot no llevan el cuerpo en memoria
+    response = get_snapshot_store().buffered(response)
+    return {
+        'path': path,
+        'status': response.status_code,
+        'body': response.get_json(silent=True)
+    }
+
+
+def setup_batch(app):
+
+    @app.route('/batch', methods=['POST'])
+    @swag_from({
+        'tags': ['batch'],
+        'summary': 'Ejecutar varias peticiones GET en una sola llamada',
+        'parameters': [
+            {
+                'name': 'body',
+                'in': 'body',
+                'required': True,
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'requests': {
+                            'type': 'array',
+                            'items': {
+                                'type': 'object',
+                                'properties': {
+                                    'method': {'type': 'string', 'example': 'GET'},
+                                    'path':   {'type': 'string', 'example': '/people/1'}
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        ],
+        'responses': {
+            200: {
+                'description': 'Respuesta de cada sub-petición, en el mismo orden',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'responses': {
+                            'type': 'array',
+                            'items': {
+                                'type': 'object',
+                                'properties': {
+                                    'path':   {'type': 'string',  'example': '/people/1'},
+                                    'status': {'type': 'integer', 'example': 200},
+                                    'body':   {'type': 'object'}
+                                }
+                            }
+                        }
+                    }
+                }
+            },
+            400: {
+                'description': 'Cuerpo inválido o demasiadas sub-peticiones',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'At most 50 requests per batch'}
+                    }
+                }
+            }
+        }
+    })
+    def batch():
+        payload = request.get_json(silent=True) or {}
+        if not isinstance(payload, dict):
+            return jsonify({'error': "Body must contain a non-empty 'requests' list"}), 400
+        subrequests = payload.get('requests')
+        if not isinstance(subrequests, list) or not subrequests:
+            return jsonify({'error': "Body must contain a non-empty 'requests' list"}), 400
+        if len(subrequests) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} requests per batch'}), 400
+
+        valid_paths = [sub['path'] for sub in subrequests if _is_get(sub)]
+
+        # Las sub-peticiones heredan la autenticación de la petición batch
+        headers = {}
+        if 'Authorization' in request.headers:
+            headers['Authorization'] = request.headers['Authorization']
+
+        prefetched = _prefetch(app, valid_paths)
+
+        results = []
+        for sub in subrequests:
+            if _is_get(sub):
+                results.append(_dispatch(app, sub['path'], headers))
+            elif isinstance(sub, dict) and isinstance(sub.get('path'), str):
+                results.append({'path': sub['path'], 'status': 405,
+                                'body': {'error': 'Only GET is allowed in a batch'}})
+            else:
+                results.append({'status': 400, 'body': {'error': 'Invalid sub-request'}})
+
+        del prefetched
+        return jsonify({'responses': results}), 200
@@ -0,0 +1,62 @@
+# src/catalog_segment.py
+
+import os
+import mmap
+import struct
+
+# ----------------------------------------------------------------
+# Segmento binario de solo lectura con el JSON de cada item del
+# catálogo, pensado para abrirse con mmap desde todos los workers: las
+# páginas viven una sola vez en la page cache del sistema y ningún
+# worker guarda su propia copia del catálogo.
+#
+#   cabecera   MAGIC (8 bytes) + número de items (uint64)
+#   índice     (id int64, offset uint64, longitud uint64) por item, ordenado por id
+#   datos      los cuerpos JSON concatenados
+#
+# Todo en little endian. Buscar un id es una búsqueda binaria sobre el
+# índice con struct.unpack_from: no se deserializa nada.
+# ----------------------------------------------------------------
+
+MAGIC = b'SWCAT01\0'
+HEADER = struct.Struct('<8sQ')
+ENTRY = struct.Struct('<qQQ')
+
+
+def write_segment(path, items):
+    """`items`: iterable de (id, cuerpo en bytes). Escribe el segmento en `path`."""
+    items = sorted(items)
+    offset = HEADER.size + ENTRY.size * len(items)
+    with open(path, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, len(items)))
+        for item_id, body in items:
+            handle.write(ENTRY.pack(item_id, offset, len(body)))
+            offset += len(body)
+        for _, body in items:
+            handle.write(body)
+
+
+class CatalogSegment:
+
+    def __init__(self, path):
+        with open(path, 'rb') as handle:
+            size = os.fstat(handle.fileno()).st_size
+            # Un segmento vacío (0 items) tiene al menos la cabecera
+            self._map = mmap.mmap(handle.fileno(), size, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a catalog segment')
+
+    def get(self, item_id):
+        """Cuerpo JSON del item (bytes) o None si no está."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry_id, offset, length = ENTRY.unpack_from(self._map, HEADER.size + middle * ENTRY.size)
+            if entry_id == item_id:
+                return self._map[offset:offset + length]
+            if entry_id < item_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
@@ -0,0 +1,276 @@
+# src/changes.py
+
+from datetime import datetime, timedelta
+
+import click
+from flask import request, jsonify, current_app, has_app_context
+from flasgger import swag_from
+from sqlalchemy import event, func, select, delete, insert
+from src.models import db, Person, Planet, CatalogChange, CatalogChangeHorizon
+
+# ----------------------------------------------------------------
+# Change feed del catálogo para sync incremental (delta sync).
+# Cada flush que inserta, modifica o borra un Person/Planet añade una
+# fila a `catalog_changes` con la misma conexión, dentro de la misma
+# transacción: si el commit falla, el cambio y su registro se pierden
+# juntos.
+#
+# Solo se registran los cambios hechos a través del ORM; un UPDATE o
+# DELETE masivo con Core (query.update(), delete()) no pasa por aquí.
+#
+# El seq se asigna en el flush pero solo es visible tras el commit. Si
+# dos transacciones se solapan, la de seq menor puede hacer commit
+# después y un cliente que ya leyó la mayor (/changes?since=, versión
+# de snapshots, stats o autocomplete) se saltaría la menor para siempre.
+# Por eso quien escribe en el log toma antes lock_change_log(), que
+# serializa la asignación de seq hasta el commit o rollback: en Postgres
+# con un advisory lock de transacción; SQLite ya serializa a los
+# escritores con el lock de la base de datos.
+# ----------------------------------------------------------------
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# Modelo -> nombre de la entidad en el feed (igual que la ruta REST)
+TRACKED_MODELS = {
+    Person: 'people',
+    Planet: 'planets',
+}
+MODELS_BY_ENTITY = {name: model for model, name in TRACKED_MODELS.items()}
+
+# Clave del advisory lock de Postgres que protege la asignación de seq
+CHANGE_LOG_LOCK_KEY = 0x63686c67
+
+
+def _record_changes(session, flush_context):
+    rows = []
+    now = datetime.utcnow()
+    for operation, objects in (('insert', session.new),
+                               ('update', session.dirty),
+                               ('delete', session.deleted)):
+        for obj in objects:
+            entity_type = TRACKED_MODELS.get(type(obj))
+            if entity_type is None:
+                continue
+            # Cambios solo en colecciones (p. ej. `fans`) no alteran el catálogo
+            if operation == 'update' and not session.is_modified(obj, include_collections=False):
+                continue
+            rows.append({'entity_type': entity_type, 'entity_id': obj.id,
+                         'operation': operation, 'changed_at': now})
+    if rows:
+        lock_change_log(session)
+        session.connection().execute(insert(CatalogChange), rows)
+        mark_catalog_changed(session)
+
+
+def lock_change_log(session):
+    """
+    Serializa la escritura en `catalog_changes` hasta el fin de la
+    transacción, para que los seq se hagan visibles en orden. Llamarla
+    antes de insertar; quien escriba el log con Core también debe hacerlo.
+    """
+    if session.info.get('change_log_locked'):
+        return
+    connection = session.connection()
+    if connection.dialect.name == 'postgresql':
+        connection.execute(select(func.pg_advisory_xact_lock(CHANGE_LOG_LOCK_KEY)))
+    session.info['change_log_locked'] = True
+
+
+def mark_catalog_changed(session):
+    """
+    Marca la transacción para avisar a los hooks de on_catalog_commit.
+    Quien escriba `catalog_changes` con Core (sin flush del ORM) debe llamarla.
+    """
+    session.info['catalog_changed'] = True
+
+
+def _after_commit(session):
+    session.info.pop('change_log_locked', None)
+    if session.info.pop('catalog_changed', False) and has_app_context():
+        for callback in current_app.extensions.get('catalog_commit_hooks', []):
+            callback()
+
+
+def _after_rollback(session):
+    session.info.pop('catalog_changed', None)
+    session.info.pop('change_log_locked', None)
+
+
+def on_catalog_commit(app, callback):
+    """Registra `callback()` para después de cada commit que cambie el catálogo."""
+    app.extensions.setdefault('catalog_commit_hooks', []).append(callback)
+
+
+def register_change_tracking(session):
+    for name, listener in (('after_flush', _record_changes),
+                           ('after_commit', _after_commit),
+                           ('after_rollback', _after_rollback)):
+        if not event.contains(session, name, listener):
+            event.listen(session, name, listener)
+
+
+def get_latest_seq(session=None):
+    """
+    Versión actual del catálogo: el último seq del log de cambios. Nunca
+    retrocede: si la compactación purgó la última tombstone cuenta el
+    horizonte.
+    """
+    session = session or db.session
+    return max(session.execute(select(func.max(CatalogChange.seq))).scalar() or 0,
+               session.execute(select(func.max(CatalogChangeHorizon.seq))).scalar() or 0)
+
+
+def get_horizon():
+    return db.session.execute(select(func.max(CatalogChangeHorizon.seq))).scalar() or 0
+
+
+def compact_changes(tombstone_retention):
+    """
+    Mantiene el log acotado:
+      1) borra las entradas superadas por otra más reciente de la misma
+         entidad (aplicar solo la última deja al cliente en el mismo estado);
+      2) purga tombstones más antiguas que `tombstone_retention` y sube el
+         horizonte para que los clientes más atrasados hagan un resync.
+    Devuelve (superadas borradas, tombstones purgadas).
+    """
+    latest = (select(func.max(CatalogChange.seq))
+              .group_by(CatalogChange.entity_type, CatalogChange.entity_id))
+    superseded = db.session.execute(
+        delete(CatalogChange).where(CatalogChange.seq.not_in(latest))
+    ).rowcount
+
+    cutoff = datetime.utcnow() - tombstone_retention
+    old_tombstones = (CatalogChange.operation == 'delete') & (CatalogChange.changed_at < cutoff)
+    purged_max = db.session.execute(
+        select(func.max(CatalogChange.seq)).where(old_tombstones)
+    ).scalar()
+    purged = 0
+    if purged_max is not None:
+        purged = db.session.execute(delete(CatalogChange).where(old_tombstones)).rowcount
+        horizon = db.session.get(CatalogChangeHorizon, 1)
+        if horizon is None:
+            db.session.add(CatalogChangeHorizon(id=1, seq=purged_max))
+        else:
+            horizon.seq = max(horizon.seq, purged_max)
+    db.session.commit()
+    return superseded, purged
+
+
+def setup_changes(app):
+    register_change_tracking(db.session)
+
+    @app.route('/changes', methods=['GET'])
+    @swag_from({
+        'tags': ['changes'],
+        'summary': 'Cambios del catálogo posteriores a un número de secuencia',
+        'parameters': [
+            {
+                'name': 'since',
+                'in': 'query',
+                'description': 'Último seq aplicado por el cliente (0 = desde el principio)',
+                'required': False,
+                'type': 'integer'
+            },
+            {
+                'name': 'limit',
+                'in': 'query',
+                'description': f'Cambios por página (máximo {MAX_PAGE_SIZE})',
+                'required': False,
+                'type': 'integer'
+            }
+        ],
+        'responses': {
+            200: {
+                'description': 'Cambios en orden de seq; `data` es null en las tombstones',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'changes': {
+                            'type': 'array',
+                            'items': {
+                                'type': 'object',
+                                'properties': {
+                                    'seq':         {'type': 'integer', 'example': 42},
+                                    'entity_type': {'type': 'string',  'example': 'planets'},
+                                    'entity_id':   {'type': 'integer', 'example': 1},
+                                    'operation':   {'type': 'string',  'example': 'update'},
+                                    'data':        {'type': 'object'}
+                                }
+                            }
+                        },
+                        'next_since': {'type': 'integer', 'example': 42},
+                        'has_more':   {'type': 'boolean', 'example': False}
+                    }
+                }
+            },
+            400: {
+                'description': 'Parámetros inválidos',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'since and limit must be integers'}
+                    }
+                }
+            },
+            410: {
+                'description': 'El log se compactó después de `since`: hay que resincronizar todo',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error':   {'type': 'string',  'example': 'Change log compacted, full resync required'},
+                        'horizon': {'type': 'integer', 'example': 1000}
+                    }
+                }
+            }
+        }
+    })
+    def get_changes():
+        try:
+            since = max(int(request.args.get('since', 0)), 0)
+            limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'error': 'since and limit must be integers'}), 400
+
+        # Un cliente nuevo (since=0) no tiene nada que borrar: le basta el log compactado
+        horizon = get_horizon()
+        if 0 < since < horizon:
+            return jsonify({'error': 'Change log compacted, full resync required',
+                            'horizon': horizon}), 410
+
+        changes = (CatalogChange.query
+                   .filter(CatalogChange.seq > since)
+                   .order_by(CatalogChange.seq)
+                   .limit(limit + 1)
+                   .all())
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        # Estado actual de las entidades afectadas: una consulta IN por tipo
+        current = {}
+        for entity_type, model in MODELS_BY_ENTITY.items():
+            ids = {c.entity_id for c in changes if c.entity_type == entity_type}
+            if ids:
+                for obj in model.query.filter(model.id.in_(ids)):
+                    current[(entity_type, obj.id)] = obj.serialize()
+
+        return jsonify({
+            'changes': [{
+                'seq': c.seq,
+                'entity_type': c.entity_type,
+                'entity_id': c.entity_id,
+                'operation': c.operation,
+                'data': None if c.operation == 'delete' else current.get((c.entity_type, c.entity_id))
+            } for c in changes],
+            'next_since': changes[-1].seq if changes else since,
+            'has_more': has_more
+        }), 200
+
+    @app.cli.command('compact-changes')
+    @click.option('--tombstone-days', type=int, default=30,
+                  help='Días que se conservan las tombstones')
+    def compact_changes_command(tombstone_days):
+        """Compacta el log de cambios del catálogo."""
+        superseded, purged = compact_changes(timedelta(days=tombstone_days))
+        click.echo(f'Removed {superseded} superseded entries and {purged} tombstones '
+                   f'(horizon={get_horizon()})')
@@ -0,0 +1,324 @@
+# src/events.py
+
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from itertools import islice
+
+from flask import Response, request, current_app, g
+from flasgger import swag_from
+from src.auth import token_required
+from src.favorites import top_favorites
+
+# ----------------------------------------------------------------
+# Pub/sub en proceso + stream Server-Sent Events (GET /stream).
+#
+# El stream exige token (cabecera o ?access_token=, que es lo único que
+# puede mandar un EventSource): cada cliente recibe solo sus propios eventos
+# de favoritos (publicados con `user_id`) más los que no tienen
+# destinatario (popularity, resync), que son para todos.
+#
+# Todos los eventos van a un único ring buffer con número de secuencia;
+# publicar es O(1) (append + notify_all) sin importar cuántos clientes
+# haya, y cada suscriptor solo guarda su último seq leído. No hay colas
+# ni hilos por cliente: con los workers gevent de gunicorn.conf.py
+# miles de conexiones ociosas son greenlets esperando en la misma
+# Condition (ver benchmarks/sse_idle.py).
+#
+# Para propagar eventos entre workers se puede activar un backplane de
+# fichero compartido (EVENTS_BACKPLANE_PATH), ver FileBackplane.
+# ----------------------------------------------------------------
+
+DEFAULT_BUFFER_SIZE = 1024
+KEEPALIVE_SECONDS = 15
+DEFAULT_POPULARITY_INTERVAL = 10
+DEFAULT_POPULARITY_TOP_N = 10
+
+
+class EventBroker:
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE, backplane=None):
+        self._buffer = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.subscribers = 0
+        self.backplane = backplane
+        # Último top-N publicado, para enviarlo a cada cliente nuevo
+        self.last_popularity = None
+        self._epoch = None
+        self._epoch_pid = None
+
+    @property
+    def epoch(self):
+        """
+        Identifica la secuencia de este proceso. Los ids de evento son
+        "<epoch>:<seq>", así un Last-Event-ID de otro worker (u otro
+        arranque) no se confunde con un seq local.
+        """
+        if self._epoch_pid != os.getpid():
+            self._epoch = uuid.uuid4().hex[:8]
+            self._epoch_pid = os.getpid()
+        return self._epoch
+
+    def publish(self, event, data, broadcast=True, user_id=None):
+        """
+        Publica localmente y, si hay backplane, en el resto de workers.
+        Con `user_id` el evento solo se entrega a los streams de ese usuario.
+        """
+        self._append(event, json.dumps(data), user_id)
+        if broadcast and self.backplane is not None:
+            self.backplane.send(event, data, user_id)
+
+    def _append(self, event, payload, user_id=None):
+        with self._cond:
+            self._seq += 1
+            self._buffer.append((self._seq, event, payload, user_id))
+            self._cond.notify_all()
+
+    def listen(self, last_seq=None, timeout=KEEPALIVE_SECONDS):
+        """
+        Generador de (seq, evento, json, user_id destinatario o None).
+        Produce None si pasa `timeout`
+        sin eventos (para enviar un keep-alive). Si el cliente se quedó
+        más atrás de lo que guarda el buffer recibe un evento 'resync'.
+        """
+        with self._cond:
+            self.subscribers += 1
+            if last_seq is None or last_seq > self._seq:
+                last_seq = self._seq
+        try:
+            while True:
+                with self._cond:
+                    if self._seq <= last_seq:
+                        self._cond.wait(timeout)
+                    missed = self._seq - last_seq
+                    lagged = missed > len(self._buffer)
+                    if lagged:
+                        missed = len(self._buffer)
+                    pending = list(islice(self._buffer, len(self._buffer) - missed, None))
+                    if lagged:
+                        # seq del evento 'resync' = justo antes del primer evento disponible
+                        pending.insert(0, (self._seq - missed, 'resync', '{}', None))
+                    last_seq = self._seq
+
+                if not pending:
+                    yield None
+                for item in pending:
+                    yield item
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+
+class FileBackplane:
+    """
+    Difusión entre procesos de la misma máquina mediante un fichero
+    compartido de JSON lines. Cada worker añade sus eventos con O_APPEND
+    (una única write por línea) y un hilo sigue el fichero y reinyecta en
+    su broker los eventos de otros workers. Se rota al superar `max_bytes`.
+    Sirve tal cual con varios procesos en local; en varias máquinas habría
+    que sustituirlo por un pub/sub de red con la misma interfaz (send/start).
+    """
+
+    def __init__(self, path, max_bytes=8 * 1024 * 1024, poll_interval=0.2):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.poll_interval = poll_interval
+        self.origin = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def send(self, event, data, user_id=None):
+        line = json.dumps({'origin': self.origin, 'event': event, 'data': data,
+                           'user_id': user_id}) + '\n'
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode('utf-8'))
+                if os.fstat(fd).st_size > self.max_bytes:
+                    os.replace(self.path, self.path + '.1')
+            finally:
+                os.close(fd)
+
+    def start(self, broker):
+        """Arranca (una vez por proceso, también tras un fork) el hilo lector."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Cada proceso es un origen distinto, aunque herede el objeto del master
+            self.origin = uuid.uuid4().hex
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._follow, args=(broker,), daemon=True)
+            self._thread.start()
+
+    def _open_at_end(self):
+        fd = os.open(self.path, os.O_RDONLY | os.O_CREAT, 0o644)
+        handle = os.fdopen(fd, 'rb')
+        handle.seek(0, os.SEEK_END)
+        return handle
+
+    def _follow(self, broker):
+        handle = self._open_at_end()
+        partial = b''
+        while True:
+            chunk = handle.read()
+            if chunk:
+                lines = (partial + chunk).split(b'\n')
+                partial = lines.pop()
+                for line in lines:
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        continue
+                    if message.get('origin') != self.origin:
+                        broker._append(message['event'], json.dumps(message['data']),
+                                       message.get('user_id'))
+                continue
+            # Sin datos nuevos: ¿se rotó el fichero? Ya leímos lo que quedaba del antiguo
+            try:
+                rotated = os.stat(self.path).st_ino != os.fstat(handle.fileno()).st_ino
+            except FileNotFoundError:
+                rotated = False
+            if rotated:
+                handle.close()
+                handle = open(self.path, 'rb')
+                partial = b''
+                continue
+            time.sleep(self.poll_interval)
+
+
+def get_broker():
+    return current_app.extensions['event_broker']
+
+
+def publish_event(event, data, user_id=None):
+    get_broker().publish(event, data, user_id=user_id)
+
+
+def _start_popularity_ticker(app, broker, interval, top_n):
+    """
+    Calcula cada `interval` segundos el top-N de favoritos (solo si hay
+    clientes) y lo publica cuando cambia.
+    """
+    def tick():
+        while True:
+            time.sleep(interval)
+            if broker.subscribers == 0:
+                continue
+            try:
+                with app.app_context():
+                    snapshot = {
+                        'planets': top_favorites('planet', top_n),
+                        'people': top_favorites('people', top_n),
+                    }
+            except Exception:
+                app.logger.exception('Popularity snapshot failed')
+                continue
+            payload = json.dumps(snapshot)
+            if payload != broker.last_popularity:
+                broker.last_popularity = payload
+                # Cada worker calcula el suyo: no se difunde por el backplane
+                broker.publish('popularity', snapshot, broadcast=False)
+
+    thread = threading.Thread(target=tick, daemon=True)
+    thread.start()
+    return thread
+
+
+def setup_events(app):
+    backplane = None
+    if os.environ.get('EVENTS_BACKPLANE_PATH'):
+        backplane = FileBackplane(os.environ['EVENTS_BACKPLANE_PATH'])
+    broker = EventBroker(
+        buffer_size=int(os.environ.get('EVENTS_BUFFER_SIZE', DEFAULT_BUFFER_SIZE)),
+        backplane=backplane
+    )
+    app.extensions['event_broker'] = broker
+
+    interval = float(os.environ.get('POPULARITY_INTERVAL', DEFAULT_POPULARITY_INTERVAL))
+    top_n = int(os.environ.get('POPULARITY_TOP_N', DEFAULT_POPULARITY_TOP_N))
+    ticker = {'pid': None}
+    ticker_lock = threading.Lock()
+
+    def ensure_background_threads():
+        # Los hilos no sobreviven a un fork: se arrancan en el primer
+        # /stream de cada proceso
+        with ticker_lock:
+            if ticker['pid'] != os.getpid():
+                ticker['pid'] = os.getpid()
+                _start_popularity_ticker(app, broker, interval, top_n)
+        if backplane is not None:
+            backplane.start(broker)
+
+    if backplane is not None:
+        # Los eventos de otros workers deben llegar aunque aquí aún no haya /stream
+        @app.before_request
+        def start_backplane():
+            backplane.start(broker)
+
+    @app.route('/stream', methods=['GET'])
+    @swag_from({
+        'tags': ['stream'],
+        'summary': 'Stream SSE de favoritos y popularidad',
+        'description': 'Eventos: favorite_added y favorite_removed (solo los del usuario '
+                       'del token), popularity y resync. Admite la cabecera Last-Event-ID '
+                       'para reanudar. EventSource no envía cabeceras: el token puede ir '
+                       'en ?access_token=.',
+        'security': [{'Bearer': []}],
+        'parameters': [
+            {
+                'name': 'access_token',
+                'in': 'query',
+                'description': 'Token bearer, alternativa a la cabecera Authorization',
+                'required': False,
+                'type': 'string'
+            }
+        ],
+        'produces': ['text/event-stream'],
+        'responses': {
+            200: {
+                'description': 'Flujo text/event-stream'
+            },
+            401: {
+                'description': 'Token ausente, inválido o expirado',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Missing or invalid token'}
+                    }
+                }
+            }
+        }
+    })
+    @token_required(allow_query=True)
+    def stream():
+        ensure_background_threads()
+        # El generador corre fuera del contexto de la petición: sin `g`
+        user_id = g.user_id
+        epoch, _, seq = request.headers.get('Last-Event-ID', '').partition(':')
+        last_seq = int(seq) if epoch == broker.epoch and seq.isdigit() else None
+
+        def generate():
+            # Indicamos al cliente cada cuánto reconectar si se corta
+            yield 'retry: 3000\n\n'
+            if broker.last_popularity is not None and last_seq is None:
+                # Sin id: no cambia el Last-Event-ID del cliente
+                yield f'event: popularity\ndata: {broker.last_popularity}\n\n'
+            for item in broker.listen(last_seq):
+                if item is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                seq, event, payload, recipient = item
+                if recipient is not None and recipient != user_id:
+                    continue
+                yield f'id: {broker.epoch}:{seq}\nevent: {event}\ndata: {payload}\n\n'
+
+        response = Response(generate(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # Que nginx no acumule el stream en su buffer
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
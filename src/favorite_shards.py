@@ -0,0 +1,389 @@
+# src/favorite_shards.py
+
+import os
+import re
+import hashlib
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import click
+from flask import g
+from sqlalchemy import (create_engine, event, MetaData, Table, Column, Integer, DateTime, Index,
+                        select, insert, delete, exists, func)
+from sqlalchemy.exc import IntegrityError
+from src.models import db, User
+from src.favorites import FAVORITE_KINDS, get_favorite_shards
+from src.warmup import on_warmup
+from src.utils import chunks
+
+# ----------------------------------------------------------------
+# Reparto opcional de los favoritos entre N bases de datos por user_id.
+#
+#   FAVORITES_SHARDS="s0=sqlite:////data/fav0.db,s1=postgresql://..."
+#
+# Cada shard es nombre=URI; lo que se hashea es el nombre, así que la
+# URI de un shard puede cambiar sin mover datos. Vacío: todo sigue en
+# la BD principal, como siempre.
+#
+#  - Rutado por hash consistente: un anillo con VNODES puntos por shard
+#    (md5 del nombre) y el md5 del user_id. Pasar de N a N+1 shards
+#    solo cambia de dueño a ~1/(N+1) de los usuarios.
+#  - Todas las lecturas y escrituras de un usuario van a su shard. El
+#    catálogo sigue en la BD principal: list_favorites lee los ids en el
+#    shard y carga los Person/Planet de la principal.
+#  - Transacciones: cada app context abre como mucho una conexión por
+#    shard; se confirman en el before_commit de db.session y se deshacen
+#    con su rollback, así que las vistas siguen haciendo solo
+#    db.session.commit(). No es un commit en dos fases: un fallo entre
+#    shards (borrados masivos) puede dejar unos confirmados y otros no.
+#  - Sin FKs entre bases de datos: antes de confirmar se comprueba que
+#    existen los usuarios con favoritos nuevos (IntegrityError, igual
+#    que la FK users.id sin shards).
+#  - Consultas entre usuarios (top_favorites, fans, borrar un item de
+#    todos los favoritos): scatter-gather sobre todos los shards.
+#
+# Las tablas de los shards no las gestiona Alembic: se crean con
+# `flask init-favorite-shards`. Tras cambiar FAVORITES_SHARDS,
+# `flask rebalance-favorites` mueve las filas de los usuarios que han
+# cambiado de shard (--from-main para la migración inicial desde la BD
+# principal). Mientras dura, los favoritos de un usuario en tránsito
+# pueden verse incompletos.
+# ----------------------------------------------------------------
+
+VNODES = 128
+MAIN_SOURCE = 'main'
+
+shard_metadata = MetaData()
+
+
+def _shard_table(table, item_col):
+    # Mismas columnas e índices que en la BD principal, sin las FKs
+    shard_table = Table(
+        table.name, shard_metadata,
+        Column('id',          Integer, primary_key=True),
+        Column('user_id',     Integer, nullable=False),
+        Column(item_col.name, Integer, nullable=False),
+        Column('created_at',  DateTime, default=datetime.utcnow),
+        Index(f'ix_{table.name}_user_id_{item_col.name}', 'user_id', item_col.name),
+        Index(f'ix_{table.name}_{item_col.name}', item_col.name)
+    )
+    return shard_table, shard_table.c[item_col.name]
+
+
+# tipo -> (tabla en los shards, columna del item)
+SHARD_TABLES = {kind: _shard_table(table, item_col)
+                for kind, (table, item_col, _) in FAVORITE_KINDS.items()}
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(str(value).encode('utf-8')).digest()[:8], 'big')
+
+
+def parse_shards(value):
+    """'s0=uri0,s1=uri1' -> {'s0': 'uri0', 's1': 'uri1'}"""
+    shards = {}
+    for part in (p.strip() for p in value.split(',')):
+        if not part:
+            continue
+        name, sep, uri = part.partition('=')
+        if not sep or not re.fullmatch(r'\w+', name) or name == MAIN_SOURCE:
+            raise ValueError(f'Invalid favorites shard "{part}": expected name=uri')
+        shards[name] = uri.replace('postgres://', 'postgresql://', 1)
+    return shards
+
+
+class HashRing:
+
+    def __init__(self, names, vnodes=VNODES):
+        points = sorted((_hash(f'{name}#{i}'), name) for name in names for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def get(self, key):
+        position = bisect_right(self._points, _hash(key))
+        return self._names[position % len(self._names)]
+
+
+class FavoriteShards:
+
+    def __init__(self, shards, vnodes=VNODES):
+        self.engines = {name: create_engine(uri) for name, uri in shards.items()}
+        self.ring = HashRing(self.engines, vnodes)
+
+    def shard_for(self, user_id):
+        return self.ring.get(user_id)
+
+    def dispose(self):
+        for engine in self.engines.values():
+            engine.dispose()
+
+    # --------------- transacción ligada a db.session ---------------
+
+    def connection(self, name):
+        """Conexión del app context al shard `name` (se confirma con db.session)."""
+        connections = g.setdefault('favorite_shard_connections', {})
+        if name not in connections:
+            connections[name] = self.engines[name].connect()
+        return connections[name]
+
+    def _user_connection(self, user_id):
+        return self.connection(self.shard_for(user_id))
+
+    def commit(self, session):
+        new_users = g.pop('favorite_shard_new_users', None)
+        if new_users:
+            found = set(session.scalars(select(User.id).where(User.id.in_(list(new_users)))))
+            missing = sorted(new_users - found)
+            if missing:
+                self.rollback()
+                raise IntegrityError('INSERT INTO favorites', {'user_id': missing},
+                                     LookupError('favorites for unknown users'))
+        for connection in g.get('favorite_shard_connections', {}).values():
+            connection.commit()
+
+    def rollback(self):
+        g.pop('favorite_shard_new_users', None)
+        for connection in g.get('favorite_shard_connections', {}).values():
+            connection.rollback()
+
+    def close(self):
+        for connection in g.pop('favorite_shard_connections', {}).values():
+            connection.close()
+
+    # --------------------- un usuario: su shard ---------------------
+
+    def list_favorites(self, user_id, kind):
+        table, item_col = SHARD_TABLES[kind]
+        _, _, model = FAVORITE_KINDS[kind]
+        ids = self._user_connection(user_id).scalars(
+            select(item_col).where(table.c.user_id == user_id).order_by(table.c.id)
+        ).all()
+        items = {}
+        for chunk in chunks(set(ids)):
+            items.update((item.id, item) for item in model.query.filter(model.id.in_(chunk)))
+        # Mismo orden que en el shard; los items ya borrados del catálogo no salen
+        return [items[item_id] for item_id in ids if item_id in items]
+
+    def is_favorite(self, user_id, kind, item_id):
+        table, item_col = SHARD_TABLES[kind]
+        return self._user_connection(user_id).scalar(
+            select(exists().where(table.c.user_id == user_id, item_col == item_id))
+        )
+
+    def add_favorite(self, user_id, kind, item_id):
+        table, item_col = SHARD_TABLES[kind]
+        self._user_connection(user_id).execute(
+            insert(table).values({'user_id': user_id, item_col.name: item_id}))
+        g.setdefault('favorite_shard_new_users', set()).add(user_id)
+
+    def remove_favorite(self, user_id, kind, item_id):
+        table, item_col = SHARD_TABLES[kind]
+        result = self._user_connection(user_id).execute(
+            delete(table).where(table.c.user_id == user_id, item_col == item_id))
+        return result.rowcount > 0
+
+    def remove_user_favorites(self, user_ids):
+        by_shard = defaultdict(list)
+        for user_id in user_ids:
+            by_shard[self.shard_for(user_id)].append(user_id)
+        for name, ids in by_shard.items():
+            for table, _ in SHARD_TABLES.values():
+                self.connection(name).execute(delete(table).where(table.c.user_id.in_(ids)))
+
+    # ------------------ entre usuarios: todos los shards ------------------
+
+    def _scatter(self, query):
+        """`query(conexión)` en todos los shards a la vez; lista de resultados."""
+        def run(engine):
+            with engine.connect() as connection:
+                return query(connection)
+        if len(self.engines) == 1:
+            return [run(engine) for engine in self.engines.values()]
+        with ThreadPoolExecutor(max_workers=len(self.engines)) as pool:
+            return list(pool.map(run, self.engines.values()))
+
+    def favorite_counts(self, kind):
+        """Counter {item_id: favoritos} sumado sobre todos los shards."""
+        table, item_col = SHARD_TABLES[kind]
+        counts = Counter()
+        for rows in self._scatter(lambda connection: connection.execute(
+                select(item_col, func.count(table.c.id)).group_by(item_col)).all()):
+            counts.update(dict(rows))
+        return counts
+
+    def top_favorites(self, kind, limit):
+        # El top de cada shard no basta: un item puede no estar en el top
+        # de ninguno y sí en el global. Se suman los recuentos completos
+        # (uno por item del catálogo, no por favorito).
+        _, _, model = FAVORITE_KINDS[kind]
+        ranked = sorted(self.favorite_counts(kind).items(), key=lambda item: (-item[1], item[0]))
+        top = []
+        for chunk in chunks(ranked, max(limit, 1)):
+            names = dict(db.session.execute(
+                select(model.id, model.name).where(model.id.in_([item_id for item_id, _ in chunk]))
+            ).all())
+            top.extend({'id': item_id, 'name': names[item_id], 'favorites': count}
+                       for item_id, count in chunk if item_id in names)
+            if len(top) >= limit:
+                break
+        return top[:limit]
+
+    def favorite_pairs(self, kind, user_ids=None):
+        """
+        Los (user_id, item_id) de todos los shards, o solo los de `user_ids`
+        (en ese caso se consulta únicamente el shard de cada usuario).
+        """
+        table, item_col = SHARD_TABLES[kind]
+        rows = []
+        if user_ids is None:
+            for shard_rows in self._scatter(lambda connection: connection.execute(
+                    select(table.c.user_id, item_col)).all()):
+                rows.extend(shard_rows)
+            return rows
+        by_shard = defaultdict(list)
+        for user_id in user_ids:
+            by_shard[self.shard_for(user_id)].append(user_id)
+        for name, ids in by_shard.items():
+            with self.engines[name].connect() as connection:
+                for chunk in chunks(ids):
+                    rows.extend(connection.execute(
+                        select(table.c.user_id, item_col)
+                        .where(table.c.user_id.in_(chunk))).all())
+        return rows
+
+    def remove_item_favorites(self, kind, item_ids):
+        # En las conexiones del app context: se confirma con db.session
+        table, item_col = SHARD_TABLES[kind]
+        return sum(self.connection(name).execute(delete(table).where(item_col.in_(item_ids))).rowcount
+                   for name in self.engines)
+
+    # ----------------------------- rebalanceo -----------------------------
+
+    def rebalance(self, sources, dry_run=False):
+        """
+        Mueve a su shard las filas de los usuarios que están en otro sitio.
+        `sources`: {nombre: (engine, {tipo: (tabla, columna del item)})} de
+        donde leer. Devuelve Counter {(origen, destino): filas}.
+        """
+        moved = Counter()
+        for source, (engine, tables) in sources.items():
+            for kind, (table, item_col) in tables.items():
+                with engine.connect() as connection:
+                    user_ids = connection.scalars(select(table.c.user_id).distinct()).all()
+                misplaced = defaultdict(list)
+                for user_id in user_ids:
+                    target = self.shard_for(user_id)
+                    if target != source:
+                        misplaced[target].append(user_id)
+                for target, ids in misplaced.items():
+                    for chunk in chunks(sorted(ids)):
+                        moved[(source, target)] += self._move(engine, table, item_col, kind,
+                                                              target, chunk, dry_run)
+        return moved
+
+    def _move(self, engine, table, item_col, kind, target, user_ids, dry_run):
+        target_table, target_item_col = SHARD_TABLES[kind]
+        with engine.connect() as source:
+            rows = source.execute(
+                select(table.c.user_id, item_col, table.c.created_at)
+                .where(table.c.user_id.in_(user_ids))
+                .order_by(table.c.id)
+            ).all()
+            if dry_run or not rows:
+                return len(rows)
+            with self.engines[target].connect() as destination:
+                # Copia idempotente: si una pasada anterior se cortó entre la
+                # copia y el borrado, lo que ya está en el destino no se duplica
+                present = set(destination.execute(
+                    select(target_table.c.user_id, target_item_col)
+                    .where(target_table.c.user_id.in_(user_ids))
+                ).all())
+                copy = []
+                for user_id, item_id, created_at in rows:
+                    if (user_id, item_id) not in present:
+                        present.add((user_id, item_id))
+                        copy.append({'user_id': user_id, target_item_col.name: item_id,
+                                     'created_at': created_at})
+                if copy:
+                    destination.execute(insert(target_table), copy)
+                destination.commit()
+            # Solo se borra del origen cuando la copia ya está confirmada
+            source.execute(delete(table).where(table.c.user_id.in_(user_ids)))
+            source.commit()
+        return len(rows)
+
+
+def _before_commit(session):
+    shards = get_favorite_shards()
+    if shards is not None:
+        shards.commit(session)
+
+
+def _after_rollback(session):
+    shards = get_favorite_shards()
+    if shards is not None:
+        shards.rollback()
+
+
+def register_shard_transactions(session):
+    for name, listener in (('before_commit', _before_commit),
+                           ('after_rollback', _after_rollback)):
+        if not event.contains(session, name, listener):
+            event.listen(session, name, listener)
+
+
+def setup_favorite_shards(app):
+    config = os.environ.get('FAVORITES_SHARDS', '').strip()
+    shards = FavoriteShards(parse_shards(config)) if config else None
+    if shards is not None:
+        app.extensions['favorite_shards'] = shards
+        register_shard_transactions(db.session)
+
+        @app.teardown_appcontext
+        def close_favorite_shards(exception=None):
+            shards.close()
+
+        # Las conexiones abiertas al calentar en el master no deben cruzar el fork
+        on_warmup(app, shards.dispose)
+
+    def require_shards():
+        if shards is None:
+            raise click.ClickException('FAVORITES_SHARDS is not set')
+        return shards
+
+    @app.cli.command('init-favorite-shards')
+    def init_favorite_shards_command():
+        """Crea las tablas de favoritos en cada shard."""
+        for name, engine in require_shards().engines.items():
+            shard_metadata.create_all(engine)
+            click.echo(f'{name}: ready')
+
+    @app.cli.command('rebalance-favorites')
+    @click.option('--from', 'retired', multiple=True, metavar='NAME=URI',
+                  help='Shard retirado que hay que vaciar (repetible)')
+    @click.option('--from-main', is_flag=True, help='Mueve también los favoritos de la BD principal')
+    @click.option('--dry-run', is_flag=True, help='Solo cuenta las filas que se moverían')
+    def rebalance_favorites_command(retired, from_main, dry_run):
+        """Lleva los favoritos de cada usuario a su shard según FAVORITES_SHARDS."""
+        shards = require_shards()
+        try:
+            retired = parse_shards(','.join(retired))
+        except ValueError as error:
+            raise click.ClickException(str(error))
+        if set(retired) & set(shards.engines):
+            raise click.ClickException('A retired shard cannot also be in FAVORITES_SHARDS')
+        for engine in shards.engines.values():
+            shard_metadata.create_all(engine)
+
+        sources = {name: (engine, SHARD_TABLES) for name, engine in shards.engines.items()}
+        sources.update((name, (create_engine(uri), SHARD_TABLES)) for name, uri in retired.items())
+        if from_main:
+            sources[MAIN_SOURCE] = (db.engine, {kind: (table, item_col)
+                                                for kind, (table, item_col, _) in FAVORITE_KINDS.items()})
+        moved = shards.rebalance(sources, dry_run=dry_run)
+        verb = 'would move' if dry_run else 'moved'
+        for (source, target), rows in sorted(moved.items()):
+            click.echo(f'{source} -> {target}: {verb} {rows} rows')
+        click.echo(f'Total: {verb} {sum(moved.values())} rows')
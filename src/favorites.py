@@ -0,0 +1,130 @@
+# src/favorites.py
+
+from flask import current_app, has_app_context
+from sqlalchemy import select, insert, delete, exists, func, literal
+from sqlalchemy.exc import IntegrityError
+from src.models import db, User, Person, Planet, FavoriteChange, favorite_planets, favorite_characters
+
+# ----------------------------------------------------------------
+# Acceso a las tablas de favoritos por user_id.
+# Trabajan directamente sobre las tablas de asociación, así que no
+# hace falta cargar la fila de `User` ni su colección completa.
+#
+# Con FAVORITES_SHARDS configurado cada función delega en los shards
+# (src/favorite_shards.py); el resto de la app no nota la diferencia.
+#
+# Cada cambio deja además una fila en `favorite_changes` (en la BD
+# principal, en la misma transacción) para que `flask refresh-related`
+# solo recalcule los usuarios afectados.
+# ----------------------------------------------------------------
+
+# tipo -> (tabla de asociación, columna del item, modelo)
+FAVORITE_KINDS = {
+    'planet': (favorite_planets, favorite_planets.c.planet_id, Planet),
+    'people': (favorite_characters, favorite_characters.c.person_id, Person),
+}
+
+
+def get_favorite_shards():
+    """Los shards de favoritos de la app actual, o None si no hay."""
+    return current_app.extensions.get('favorite_shards') if has_app_context() else None
+
+
+def record_favorite_changes(rows, session=None):
+    """Encola [{'kind', 'user_id', 'item_id'}] para el próximo refresh-related."""
+    if rows:
+        (session or db.session).connection().execute(insert(FavoriteChange), rows)
+
+
+def list_favorites(user_id, kind):
+    shards = get_favorite_shards()
+    if shards is not None:
+        return shards.list_favorites(user_id, kind)
+    table, item_col, model = FAVORITE_KINDS[kind]
+    return (model.query
+            .join(table, item_col == model.id)
+            .filter(table.c.user_id == user_id)
+            .order_by(table.c.id)
+            .all())
+
+
+def is_favorite(user_id, kind, item_id):
+    shards = get_favorite_shards()
+    if shards is not None:
+        return shards.is_favorite(user_id, kind, item_id)
+    table, item_col, _ = FAVORITE_KINDS[kind]
+    return db.session.execute(
+        select(exists().where(table.c.user_id == user_id, item_col == item_id))
+    ).scalar()
+
+
+def add_favorite(user_id, kind, item_id):
+    record_favorite_changes([{'kind': kind, 'user_id': user_id, 'item_id': item_id}])
+    shards = get_favorite_shards()
+    if shards is not None:
+        return shards.add_favorite(user_id, kind, item_id)
+    table, item_col, _ = FAVORITE_KINDS[kind]
+    # INSERT ... SELECT condicionado a que exista el usuario: SQLite no
+    # comprueba la FK users.id (sin PRAGMA foreign_keys) y quedarían
+    # favoritos huérfanos. Igual que los shards, falla con IntegrityError.
+    result = db.session.execute(
+        insert(table).from_select(
+            ['user_id', item_col.name],
+            select(literal(user_id), literal(item_id)).where(exists().where(User.id == user_id))
+        )
+    )
+    if result.rowcount == 0:
+        raise IntegrityError('INSERT INTO favorites', {'user_id': user_id},
+                             LookupError('favorites for unknown users'))
+
+
+def remove_favorite(user_id, kind, item_id):
+    """Devuelve True si había un favorito que eliminar."""
+    shards = get_favorite_shards()
+    if shards is not None:
+        removed = shards.remove_favorite(user_id, kind, item_id)
+    else:
+        table, item_col, _ = FAVORITE_KINDS[kind]
+        removed = db.session.execute(
+            delete(table).where(table.c.user_id == user_id, item_col == item_id)
+        ).rowcount > 0
+    if removed:
+        record_favorite_changes([{'kind': kind, 'user_id': user_id, 'item_id': item_id}])
+    return removed
+
+
+def top_favorites(kind, limit):
+    """Los `limit` items con más fans, con su número de favoritos."""
+    shards = get_favorite_shards()
+    if shards is not None:
+        return shards.top_favorites(kind, limit)
+    table, item_col, model = FAVORITE_KINDS[kind]
+    favorites = func.count(table.c.id).label('favorites')
+    rows = (db.session.query(model.id, model.name, favorites)
+            .join(table, item_col == model.id)
+            .group_by(model.id, model.name)
+            .order_by(favorites.desc(), model.id)
+            .limit(limit)
+            .all())
+    return [{'id': row.id, 'name': row.name, 'favorites': row.favorites} for row in rows]
+
+
+def remove_item_favorites(kind, item_ids):
+    """Quita los items de los favoritos de todos los usuarios. Devuelve cuántos."""
+    record_favorite_changes([{'kind': kind, 'user_id': None, 'item_id': item_id} for item_id in item_ids])
+    shards = get_favorite_shards()
+    if shards is not None:
+        return shards.remove_item_favorites(kind, item_ids)
+    table, item_col, _ = FAVORITE_KINDS[kind]
+    return db.session.execute(delete(table).where(item_col.in_(item_ids))).rowcount
+
+
+def remove_user_favorites(user_ids):
+    """Borra todos los favoritos de los usuarios (antes de borrarlos)."""
+    record_favorite_changes([{'kind': kind, 'user_id': user_id, 'item_id': None}
+                             for kind in FAVORITE_KINDS for user_id in user_ids])
+    shards = get_favorite_shards()
+    if shards is not None:
+        return shards.remove_user_favorites(user_ids)
+    for table, _, _ in FAVORITE_KINDS.values():
+        db.session.execute(delete(table).where(table.c.user_id.in_(user_ids)))
@@ -0,0 +1,209 @@
+# src/idempotency.py
+
+import os
+import time
+import random
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from functools import wraps
+
+import click
+from flask import request, jsonify, g, current_app
+from sqlalchemy import select, insert, update, delete, or_, and_
+from sqlalchemy.exc import IntegrityError
+from src.models import db, IdempotencyKey
+
+# ----------------------------------------------------------------
+# Cabecera `Idempotency-Key` para las mutaciones de favoritos.
+#
+# La primera petición con una clave la reserva (estado "en curso"),
+# ejecuta la vista y guarda su status y cuerpo. Un reintento con la
+# misma clave recibe esa misma respuesta (con `Idempotent-Replayed:
+# true`) sin ejecutar la vista ni tocar las tablas de favoritos. Las
+# claves son por usuario y caducan a los IDEMPOTENCY_TTL segundos.
+#
+#  - Reintento mientras la original sigue en curso -> 409 + Retry-After
+#  - Misma clave con otra ruta o método           -> 422
+#  - Respuestas 5xx: no se guardan, se puede reintentar
+#
+# Dos almacenes con la misma interfaz (reserve/complete/release):
+#  - DatabaseIdempotencyStore (por defecto): tabla `idempotency_keys`;
+#    la PK (user_id, key) hace atómica la reserva entre workers.
+#  - MemoryIdempotencyStore: por proceso y acotado a `max_entries`;
+#    solo sirve con un único worker (desarrollo, tests).
+# ----------------------------------------------------------------
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_ENTRIES = 10000
+MAX_KEY_LENGTH = 255
+# Una reserva sin completar más antigua que esto se da por abandonada
+# (el worker murió a mitad de petición)
+LOCK_TIMEOUT = 30
+PURGE_PROBABILITY = 0.01
+
+StoredResponse = namedtuple('StoredResponse', 'fingerprint status body content_type')
+
+
+class MemoryIdempotencyStore:
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()    # (user_id, key) -> (caduca, reservada, StoredResponse)
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # Orden de inserción = orden de caducidad (TTL fijo)
+        while self._entries:
+            expires, _, _ = next(iter(self._entries.values()))
+            if expires > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def reserve(self, user_id, key, fingerprint):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get((user_id, key))
+            if entry is not None:
+                _, reserved_at, stored = entry
+                if stored.status is not None or now - reserved_at < LOCK_TIMEOUT:
+                    return stored
+            self._entries[(user_id, key)] = (now + self.ttl, now, StoredResponse(fingerprint, None, None, None))
+            self._entries.move_to_end((user_id, key))
+            return None
+
+    def complete(self, user_id, key, status, body, content_type):
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is not None:
+                expires, reserved_at, stored = entry
+                self._entries[(user_id, key)] = (expires, reserved_at,
+                                                 stored._replace(status=status, body=body,
+                                                                 content_type=content_type))
+
+    def release(self, user_id, key):
+        with self._lock:
+            self._entries.pop((user_id, key), None)
+
+
+class DatabaseIdempotencyStore:
+    """
+    Usa db.session y hace commit en cada paso: la reserva tiene que ser
+    visible para los demás workers antes de ejecutar la vista. Las vistas
+    de favoritos ya han hecho commit (o rollback) cuando se guarda la respuesta.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+
+    def reserve(self, user_id, key, fingerprint):
+        now = datetime.utcnow()
+        if random.random() < PURGE_PROBABILITY:
+            self.purge()
+        this_key = (IdempotencyKey.user_id == user_id) & (IdempotencyKey.key == key)
+        # Libera la clave si caducó o si su reserva quedó abandonada
+        db.session.execute(delete(IdempotencyKey).where(this_key, or_(
+            IdempotencyKey.expires_at < now,
+            and_(IdempotencyKey.status_code.is_(None),
+                 IdempotencyKey.created_at < now - timedelta(seconds=LOCK_TIMEOUT))
+        )))
+        try:
+            db.session.execute(insert(IdempotencyKey).values(
+                user_id=user_id, key=key, fingerprint=fingerprint,
+                created_at=now, expires_at=now + timedelta(seconds=self.ttl)))
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+        row = db.session.execute(select(IdempotencyKey).where(this_key)).scalar_one_or_none()
+        if row is None:
+            # Se liberó entre el INSERT y el SELECT: que el cliente reintente
+            return StoredResponse(fingerprint, None, None, None)
+        return StoredResponse(row.fingerprint, row.status_code, row.body, row.content_type)
+
+    def complete(self, user_id, key, status, body, content_type):
+        db.session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            .values(status_code=status, body=body, content_type=content_type)
+        )
+        db.session.commit()
+
+    def release(self, user_id, key):
+        db.session.rollback()
+        db.session.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id, IdempotencyKey.key == key))
+        db.session.commit()
+
+    def purge(self):
+        """Borra las claves caducadas. Devuelve cuántas."""
+        count = db.session.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+        return count
+
+
+def get_idempotency_store():
+    return current_app.extensions['idempotency_store']
+
+
+def idempotent(view):
+    """
+    Respeta `Idempotency-Key` en la vista. Va debajo de @token_required:
+    las claves son por usuario (g.user_id). Sin cabecera no hace nada.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters'}), 400
+
+        store = get_idempotency_store()
+        fingerprint = f'{request.method} {request.path}'
+        stored = store.reserve(g.user_id, key, fingerprint)
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                return jsonify({'error': 'Idempotency-Key already used for a different request'}), 422
+            if stored.status is None:
+                response = jsonify({'error': 'A request with this Idempotency-Key is in progress'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            response = current_app.response_class(stored.body, status=stored.status,
+                                                  mimetype=stored.content_type)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            store.release(g.user_id, key)
+            raise
+        if response.status_code >= 500:
+            store.release(g.user_id, key)
+        else:
+            store.complete(g.user_id, key, response.status_code, response.get_data(), response.mimetype)
+        return response
+    return wrapper
+
+
+def setup_idempotency(app):
+    ttl = int(os.environ.get('IDEMPOTENCY_TTL', DEFAULT_TTL))
+    if os.environ.get('IDEMPOTENCY_STORE', 'database') == 'memory':
+        store = MemoryIdempotencyStore(
+            ttl=ttl, max_entries=int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)))
+    else:
+        store = DatabaseIdempotencyStore(ttl=ttl)
+    app.extensions['idempotency_store'] = store
+
+    @app.cli.command('purge-idempotency-keys')
+    def purge_idempotency_keys_command():
+        """Borra las Idempotency-Key caducadas."""
+        if isinstance(store, DatabaseIdempotencyStore):
+            click.echo(f'Removed {store.purge()} expired idempotency keys')
+        else:
+            click.echo('In-memory store: nothing to purge')
@@ -62,6 +62,15 @@ class Person(db.Model):
     def __repr__(self):
         return f"<Person(id={self.id}, name='{self.name}')>"
 
+    def serialize(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'birth_year': self.birth_year,
+            'gender': self.gender,
+            'eye_color': self.eye_color
+        }
+
 
 class Planet(db.Model):
     """
@@ -72,7 +81,7 @@ class Planet(db.Model):
     name       = db.Column(db.String(100), unique=True, nullable=False)
     climate    = db.Column(db.String(100), nullable=True)
     terrain    = db.Column(db.String(100), nullable=True)
-    population = db.Column(db.Integer, nullable=True)
+    population = db.Column(db.BigInteger, nullable=True)   # Coruscant: 1e12 habitantes
 
     # Relación Muchos-a-muchos con User (favoritos de planetas)
     fans = db.relationship(
@@ -84,6 +93,15 @@ class Planet(db.Model):
     def __repr__(self):
         return f"<Planet(id={self.id}, name='{self.name}')>"
 
+    def serialize(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'climate': self.climate,
+            'terrain': self.terrain,
+            'population': self.population
+        }
+
 
 class Post(db.Model):
     """
@@ -91,6 +109,12 @@ class Post(db.Model):
     los usuarios puedan escribir posts en el blog.
     """
     __tablename__ = 'posts'
+    __table_args__ = (
+        # Feed por autor: WHERE user_id = ? ORDER BY created_at, id
+        db.Index('ix_posts_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        # Feed global: ORDER BY created_at, id
+        db.Index('ix_posts_created_at_id', 'created_at', 'id'),
+    )
     id         = db.Column(db.Integer, primary_key=True)
     title      = db.Column(db.String(200), nullable=False)
     content    = db.Column(db.Text, nullable=False)
@@ -107,7 +131,10 @@ favorite_planets = db.Table(
     db.Column('id', db.Integer, primary_key=True),
     db.Column('user_id',   db.Integer, db.ForeignKey('users.id'),   nullable=False),
     db.Column('planet_id', db.Integer, db.ForeignKey('planets.id'), nullable=False),
-    db.Column('created_at', db.DateTime, default=datetime.utcnow)
+    db.Column('created_at', db.DateTime, default=datetime.utcnow),
+    # Favoritos de un usuario / fans de un planeta
+    db.Index('ix_favorite_planets_user_id_planet_id', 'user_id', 'planet_id'),
+    db.Index('ix_favorite_planets_planet_id', 'planet_id')
 )
 
 favorite_characters = db.Table(
@@ -115,5 +142,127 @@ favorite_characters = db.Table(
     db.Column('id',           db.Integer, primary_key=True),
     db.Column('user_id',      db.Integer, db.ForeignKey('users.id'),   nullable=False),
     db.Column('person_id',    db.Integer, db.ForeignKey('people.id'),  nullable=False),
-    db.Column('created_at',   db.DateTime, default=datetime.utcnow)
+    db.Column('created_at',   db.DateTime, default=datetime.utcnow),
+    # Favoritos de un usuario / fans de un personaje
+    db.Index('ix_favorite_characters_user_id_person_id', 'user_id', 'person_id'),
+    db.Index('ix_favorite_characters_person_id', 'person_id')
 )
+
+
+# Clases mapeadas sobre las tablas de asociación para poder gestionarlas
+# como filas sueltas (p. ej. desde flask-admin). Las relaciones de User,
+# Person y Planet siguen usando las tablas directamente.
+class FavoritePlanet(db.Model):
+    __table__ = favorite_planets
+
+    def __repr__(self):
+        return f"<FavoritePlanet(user_id={self.user_id}, planet_id={self.planet_id})>"
+
+
+class FavoriteCharacter(db.Model):
+    __table__ = favorite_characters
+
+    def __repr__(self):
+        return f"<FavoriteCharacter(user_id={self.user_id}, person_id={self.person_id})>"
+
+
+# ----------------------------------------------------------------
+# Registro de cambios del catálogo (sync incremental de clientes)
+# ----------------------------------------------------------------
+
+class CatalogChange(db.Model):
+    """
+    Log append-only de inserts/updates/deletes sobre Person y Planet.
+    Se escribe en la misma transacción que el cambio (ver changes.py).
+    `seq` es monótono: con AUTOINCREMENT SQLite nunca reutiliza valores,
+    aunque la compactación borre las últimas filas.
+    """
+    __tablename__ = 'catalog_changes'
+    __table_args__ = (
+        db.Index('ix_catalog_changes_entity', 'entity_type', 'entity_id', 'seq'),
+        {'sqlite_autoincrement': True},
+    )
+    seq         = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)   # 'people' | 'planets'
+    entity_id   = db.Column(db.Integer, nullable=False)
+    operation   = db.Column(db.String(10), nullable=False)   # 'insert' | 'update' | 'delete'
+    changed_at  = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<CatalogChange(seq={self.seq}, {self.operation} {self.entity_type}/{self.entity_id})>"
+
+
+class CatalogChangeHorizon(db.Model):
+    """
+    Una sola fila: el mayor `seq` de las tombstones ya purgadas.
+    Un cliente con `since` menor no puede saber qué se borró y debe
+    resincronizar el catálogo completo.
+    """
+    __tablename__ = 'catalog_change_horizon'
+    id  = db.Column(db.Integer, primary_key=True)
+    seq = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ----------------------------------------------------------------
+# Recomendaciones "a los fans también les gusta" (ver related.py)
+# ----------------------------------------------------------------
+
+class RelatedItem(db.Model):
+    """
+    Top-K precalculado de items favoritos a la vez que `item_id`.
+    La PK (kind, item_id, rank) es también el orden de lectura: servir
+    una recomendación es un único rango del índice.
+    """
+    __tablename__ = 'related_items'
+    kind       = db.Column(db.String(10), primary_key=True)   # 'planet' | 'people'
+    item_id    = db.Column(db.Integer, primary_key=True)
+    rank       = db.Column(db.Integer, primary_key=True)
+    related_id = db.Column(db.Integer, nullable=False)
+    score      = db.Column(db.Integer, nullable=False)         # fans en común
+
+    def __repr__(self):
+        return f"<RelatedItem({self.kind} {self.item_id} #{self.rank} -> {self.related_id})>"
+
+
+class FavoriteChange(db.Model):
+    """
+    Cola de favoritos cambiados desde el último `flask refresh-related`.
+    Una fila por cambio: (usuario, item) al añadir o quitar un favorito,
+    solo `user_id` si se borraron todos los de un usuario y solo `item_id`
+    si se quitó un item de todos los usuarios. El refresco borra las filas
+    que ha procesado.
+    """
+    __tablename__ = 'favorite_changes'
+    __table_args__ = (
+        db.Index('ix_favorite_changes_kind_id', 'kind', 'id'),
+    )
+    id      = db.Column(db.Integer, primary_key=True)
+    kind    = db.Column(db.String(10), nullable=False)   # 'planet' | 'people'
+    user_id = db.Column(db.Integer, nullable=True)
+    item_id = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f"<FavoriteChange({self.kind} user={self.user_id} item={self.item_id})>"
+
+
+# ----------------------------------------------------------------
+# Respuestas guardadas por Idempotency-Key (ver idempotency.py)
+# ----------------------------------------------------------------
+
+class IdempotencyKey(db.Model):
+    """
+    Primera respuesta de una petición con `Idempotency-Key`, por usuario.
+    `status_code` nulo = la petición original sigue en curso.
+    """
+    __tablename__ = 'idempotency_keys'
+    user_id      = db.Column(db.Integer, primary_key=True)
+    key          = db.Column(db.String(255), primary_key=True)
+    fingerprint  = db.Column(db.String(300), nullable=False)    # "POST /favorite/planet/1"
+    status_code  = db.Column(db.Integer, nullable=True)
+    body         = db.Column(db.LargeBinary, nullable=True)
+    content_type = db.Column(db.String(100), nullable=True)
+    created_at   = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at   = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey(user_id={self.user_id}, key='{self.key}', status={self.status_code})>"
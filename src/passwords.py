@@ -0,0 +1,146 @@
+# src/passwords.py
+
+import os
+import hmac
+import base64
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+# ----------------------------------------------------------------
+# Hash de contraseñas con scrypt (memory-hard, incluido en hashlib).
+# Calcularlo bloquea ~decenas de ms, así que se ejecuta en un pool de
+# procesos acotado: si la cola se llena respondemos 503 en lugar de
+# dejar a los workers de gunicorn sin atender lecturas del catálogo.
+#
+# Formato almacenado:  scrypt$<n>$<r>$<p>$<salt_b64>$<hash_b64>
+# (cabe en User.password, String(128))
+# ----------------------------------------------------------------
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=HASH_BYTES)
+
+
+def hash_password(password):
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return '$'.join([
+        'scrypt', str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P),
+        base64.b64encode(salt).decode('ascii'),
+        base64.b64encode(digest).decode('ascii')
+    ])
+
+
+def is_hashed(stored):
+    return stored.startswith('scrypt$')
+
+
+def verify_password(password, stored):
+    """
+    Compara en tiempo constante. Las filas antiguas guardadas en texto
+    plano (p. ej. las de seed.py) se aceptan; el login las re-hashea.
+    """
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+    try:
+        _, n, r, p, salt, digest = stored.split('$')
+        expected = base64.b64decode(digest)
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+# Hash de relleno para usuarios inexistentes: el login tarda lo mismo
+# exista o no el usuario (evita enumerar cuentas por tiempo de respuesta)
+DUMMY_HASH = '$'.join([
+    'scrypt', str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P),
+    base64.b64encode(bytes(SALT_BYTES)).decode('ascii'),
+    base64.b64encode(bytes(HASH_BYTES)).decode('ascii')
+])
+
+
+class HasherBusy(Exception):
+    """El pool de hashing tiene la cola llena."""
+
+
+class HasherPool:
+    """
+    Pool de procesos con límite de trabajos en vuelo (en ejecución +
+    encolados). Se crea de forma perezosa y por proceso, así que cada
+    worker de gunicorn tiene el suyo después del fork.
+    Con `workers=0` el hash se calcula en el propio hilo (desarrollo).
+    """
+
+    def __init__(self, workers, max_pending, timeout):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context(
+                    'forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        if self.workers == 0:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            # Un proceso hijo murió: se recrea el pool en la próxima llamada
+            self._slots.release()
+            self.shutdown()
+            raise HasherBusy()
+        # El hueco se libera cuando el trabajo termina de verdad, aunque
+        # el cliente ya haya recibido el 503 por timeout
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except (TimeoutError, BrokenProcessPool):
+            raise HasherBusy()
+
+    def warm(self):
+        """Arranca los procesos del pool antes de la primera petición."""
+        if self.workers == 0:
+            return
+        executor = self._get_executor()
+        for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def hash(self, password):
+        return self.run(hash_password, password)
+
+    def verify(self, password, stored):
+        return self.run(verify_password, password, stored)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
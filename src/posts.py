@@ -0,0 +1,288 @@
+# src/posts.py
+
+import json
+import base64
+import binascii
+from datetime import datetime
+
+from flask import request, jsonify, g
+from flasgger import swag_from
+from sqlalchemy import tuple_, select, exists
+from sqlalchemy.exc import IntegrityError
+from src.models import db, User, Post
+from src.auth import token_required
+
+# ----------------------------------------------------------------
+# Posts del blog y feeds paginados por keyset.
+# Los feeds se ordenan por (created_at, id) descendente y el cursor
+# es la última pareja devuelta, así que cada página es una búsqueda en
+# el índice (sin OFFSET) y las páginas profundas cuestan lo mismo.
+# ----------------------------------------------------------------
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+POST_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'id':         {'type': 'integer', 'example': 1},
+        'title':      {'type': 'string',  'example': 'La batalla de Hoth'},
+        'content':    {'type': 'string',  'example': 'Hacía mucho frío...'},
+        'created_at': {'type': 'string',  'example': '2025-06-01T12:34:56'},
+        'user_id':    {'type': 'integer', 'example': 1}
+    }
+}
+
+FEED_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'posts':       {'type': 'array', 'items': POST_SCHEMA},
+        'next_cursor': {'type': 'string', 'example': 'WyIyMDI1LTA2LTAxVDEyOjM0OjU2IiwgMTJd'}
+    }
+}
+
+FEED_PARAMETERS = [
+    {
+        'name': 'limit',
+        'in': 'query',
+        'description': f'Posts por página (máximo {MAX_PAGE_SIZE})',
+        'required': False,
+        'type': 'integer'
+    },
+    {
+        'name': 'cursor',
+        'in': 'query',
+        'description': 'Valor de next_cursor de la página anterior',
+        'required': False,
+        'type': 'string'
+    }
+]
+
+
+def serialize_post(post):
+    return {
+        'id': post.id,
+        'title': post.title,
+        'content': post.content,
+        'created_at': post.created_at.isoformat(),
+        'user_id': post.user_id
+    }
+
+
+def encode_cursor(post):
+    raw = json.dumps([post.created_at.isoformat(), post.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Devuelve (created_at, id) o lanza ValueError si el cursor no es válido."""
+    try:
+        created_at, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(post_id)
+    except (binascii.Error, UnicodeError, TypeError, json.JSONDecodeError) as error:
+        raise ValueError(str(error))
+
+
+def _feed(query):
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            created_at, post_id = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(tuple_(Post.created_at, Post.id) < (created_at, post_id))
+
+    # Pedimos uno de más para saber si hay página siguiente
+    posts = query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(posts[limit - 1]) if len(posts) > limit else None
+    return jsonify({
+        'posts': [serialize_post(p) for p in posts[:limit]],
+        'next_cursor': next_cursor
+    }), 200
+
+
+def setup_posts(app):
+
+    @app.route('/posts', methods=['POST'])
+    @swag_from({
+        'tags': ['posts'],
+        'summary': 'Publicar un post como el usuario actual',
+        'security': [{'Bearer': []}],
+        'parameters': [
+            {
+                'name': 'body',
+                'in': 'body',
+                'required': True,
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'title':   {'type': 'string', 'example': 'La batalla de Hoth'},
+                        'content': {'type': 'string', 'example': 'Hacía mucho frío...'}
+                    }
+                }
+            }
+        ],
+        'responses': {
+            201: {
+                'description': 'Post creado',
+                'schema': POST_SCHEMA
+            },
+            400: {
+                'description': 'Faltan title o content',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'title and content are required'}
+                    }
+                }
+            },
+            401: {
+                'description': 'Token ausente, inválido o expirado',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Missing or invalid token'}
+                    }
+                }
+            },
+            404: {
+                'description': 'El usuario del token ya no existe',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Current user not found'}
+                    }
+                }
+            }
+        }
+    })
+    @token_required
+    def create_post():
+        data = request.get_json(silent=True) or {}
+        title = data.get('title')
+        content = data.get('content')
+        if not isinstance(title, str) or not title.strip() or not isinstance(content, str) or not content:
+            return jsonify({'error': 'title and content are required'}), 400
+        if len(title) > 200:
+            return jsonify({'error': 'title must have at most 200 characters'}), 400
+
+        # SQLite no comprueba la FK users.id: sin esto quedarían posts huérfanos
+        if not db.session.execute(select(exists().where(User.id == g.user_id))).scalar():
+            return jsonify({'error': 'Current user not found'}), 404
+        post = Post(title=title, content=content, user_id=g.user_id)
+        db.session.add(post)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Usuario borrado entre la comprobación y el commit
+            db.session.rollback()
+            return jsonify({'error': 'Current user not found'}), 404
+        return jsonify(serialize_post(post)), 201
+
+    @app.route('/posts', methods=['GET'])
+    @swag_from({
+        'tags': ['posts'],
+        'summary': 'Feed global de posts (más recientes primero)',
+        'parameters': FEED_PARAMETERS,
+        'responses': {
+            200: {
+                'description': 'Página del feed',
+                'schema': FEED_SCHEMA
+            },
+            400: {
+                'description': 'Cursor o limit inválidos',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Invalid cursor'}
+                    }
+                }
+            }
+        }
+    })
+    def get_posts_feed():
+        return _feed(Post.query)
+
+    @app.route('/posts/<int:post_id>', methods=['GET'])
+    @swag_from({
+        'tags': ['posts'],
+        'summary': 'Obtener un post por su ID',
+        'parameters': [
+            {
+                'name': 'post_id',
+                'in': 'path',
+                'description': 'ID del post a buscar',
+                'required': True,
+                'type': 'integer'
+            }
+        ],
+        'responses': {
+            200: {
+                'description': 'Datos del post',
+                'schema': POST_SCHEMA
+            },
+            404: {
+                'description': 'Post no encontrado',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Post not found'}
+                    }
+                }
+            }
+        }
+    })
+    def get_post(post_id):
+        post = Post.query.get(post_id)
+        if not post:
+            return jsonify({'error': 'Post not found'}), 404
+        return jsonify(serialize_post(post)), 200
+
+    @app.route('/users/<int:user_id>/posts', methods=['GET'])
+    @swag_from({
+        'tags': ['posts'],
+        'summary': 'Feed de posts de un autor (más recientes primero)',
+        'parameters': [
+            {
+                'name': 'user_id',
+                'in': 'path',
+                'description': 'ID del autor',
+                'required': True,
+                'type': 'integer'
+            }
+        ] + FEED_PARAMETERS,
+        'responses': {
+            200: {
+                'description': 'Página del feed del autor',
+                'schema': FEED_SCHEMA
+            },
+            400: {
+                'description': 'Cursor o limit inválidos',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'Invalid cursor'}
+                    }
+                }
+            },
+            404: {
+                'description': 'Usuario no encontrado',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': 'User not found'}
+                    }
+                }
+            }
+        }
+    })
+    def get_user_posts(user_id):
+        # Solo comprobamos la existencia en la primera página
+        if not request.args.get('cursor') and not User.query.get(user_id):
+            return jsonify({'error': 'User not found'}), 404
+        return _feed(Post.query.filter(Post.user_id == user_id))
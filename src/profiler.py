@@ -0,0 +1,147 @@
+# src/profiler.py
+
+import os
+import hmac
+import json
+import time
+import random
+import cProfile
+import threading
+from datetime import datetime
+
+from sqlalchemy import event
+from werkzeug.exceptions import HTTPException
+from src.models import db
+
+# ----------------------------------------------------------------
+# Perfilado bajo demanda de una sola petición.
+#
+# Middleware WSGI alrededor de app.wsgi_app que activa cProfile para
+# la petición si:
+#   - trae la cabecera `X-Profile-Token` con el valor de PROFILER_TOKEN, o
+#   - cae en el muestreo PROFILER_SAMPLE_RATE (0.001 = una de cada mil).
+#
+# Cada perfil se guarda como <dir>/<id>.prof (formato pstats: snakeviz,
+# flameprof o gprof2dot lo convierten en flamegraph) junto a <id>.json
+# con ruta, tiempos y número de consultas SQL. Solo se conservan los
+# PROFILER_KEEP más recientes. La respuesta lleva `X-Profile-Id`.
+#
+# Sin token ni muestreo el middleware no se instala. Como mucho se
+# perfila una petición a la vez por proceso; el resto pasa sin perfilar.
+# El cuerpo de las respuestas en streaming (/stream) no se incluye.
+# ----------------------------------------------------------------
+
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+DEFAULT_KEEP = 50
+
+
+class RequestProfiler:
+
+    def __init__(self, app, wsgi_app, directory, token=None, sample_rate=0.0, keep=DEFAULT_KEEP):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self._busy = threading.Lock()
+        self._local = threading.local()
+
+    def _trigger(self, environ):
+        if self.token and TOKEN_HEADER in environ:
+            if hmac.compare_digest(environ[TOKEN_HEADER].encode(), self.token.encode()):
+                return 'header'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def __call__(self, environ, start_response):
+        trigger = self._trigger(environ)
+        if trigger is None or not self._busy.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        try:
+            return self._profile(environ, start_response, trigger)
+        finally:
+            self._busy.release()
+
+    def _profile(self, environ, start_response, trigger):
+        profile_id = f'{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}'
+        status = {}
+
+        def capture_start_response(code, headers, exc_info=None):
+            status['code'] = int(code.split(' ', 1)[0])
+            return start_response(code, headers + [('X-Profile-Id', profile_id)], exc_info)
+
+        self._local.sql = 0
+        profile = cProfile.Profile()
+        wall, cpu = time.perf_counter(), time.process_time()
+        profile.enable()
+        try:
+            return self.wsgi_app(environ, capture_start_response)
+        finally:
+            profile.disable()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            sql_count, self._local.sql = self._local.sql, None
+            try:
+                self._save(profile_id, profile, {
+                    'id': profile_id,
+                    'trigger': trigger,
+                    'method': environ.get('REQUEST_METHOD'),
+                    'path': environ.get('PATH_INFO'),
+                    'route': self._route(environ),
+                    'status': status.get('code'),
+                    'wall_ms': round(wall * 1000, 2),
+                    'cpu_ms': round(cpu * 1000, 2),
+                    'sql_count': sql_count,
+                    'pid': os.getpid(),
+                })
+            except OSError:
+                self.app.logger.exception('Could not save request profile')
+
+    def _route(self, environ):
+        try:
+            rule, _ = self.app.url_map.bind_to_environ(environ).match(return_rule=True)
+            return rule.rule
+        except HTTPException:
+            return None
+
+    def _save(self, profile_id, profile, metadata):
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(os.path.join(self.directory, f'{profile_id}.prof'))
+        with open(os.path.join(self.directory, f'{profile_id}.json'), 'w') as handle:
+            json.dump(metadata, handle)
+        self._rotate()
+
+    def _rotate(self):
+        profiles = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.prof'))
+        for old in profiles[:-self.keep]:
+            for suffix in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, old + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def count_statement(self, *args):
+        # Solo cuenta en el hilo de la petición que se está perfilando
+        if getattr(self._local, 'sql', None) is not None:
+            self._local.sql += 1
+
+
+def setup_profiler(app):
+    token = os.environ.get('PROFILER_TOKEN') or None
+    sample_rate = float(os.environ.get('PROFILER_SAMPLE_RATE', 0))
+    if not token and sample_rate <= 0:
+        return
+    profiler = RequestProfiler(
+        app,
+        app.wsgi_app,
+        os.environ.get('PROFILER_DIR') or os.path.join(app.instance_path, 'profiles'),
+        token=token,
+        sample_rate=sample_rate,
+        keep=int(os.environ.get('PROFILER_KEEP', DEFAULT_KEEP))
+    )
+    app.wsgi_app = profiler
+    app.extensions['request_profiler'] = profiler
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'after_cursor_execute', profiler.count_statement)
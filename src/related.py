@@ -0,0 +1,370 @@
+# src/related.py
+
+import os
+import time
+import fcntl
+
+import click
+import numpy as np
+from scipy import sparse
+from flask import request, jsonify
+from flasgger import swag_from
+from sqlalchemy import select, delete, insert, event, inspect
+from src.models import db, User, Person, Planet, FavoritePlanet, FavoriteCharacter, FavoriteChange, RelatedItem
+from src.favorites import FAVORITE_KINDS, get_favorite_shards, record_favorite_changes
+from src.utils import chunks
+
+# ----------------------------------------------------------------
+# "A los fans también les gusta": GET /planets/<id>/related y
+# GET /people/<id>/related.
+#
+# Con las tablas de favoritos se monta una matriz dispersa A
+# (usuario x item, 1 = favorito) y la co-ocurrencia item x item es
+# C = Aᵀ·A: C[i, j] = usuarios con i y j en favoritos. Del resultado se
+# guarda el top-K de cada item en `related_items`, así que servir una
+# recomendación es leer K filas por su PK, sin self-joins.
+#
+# A y C se guardan en <RELATED_STATE_DIR>/<tipo>.npz. Cada cambio de
+# favoritos encola una fila en `favorite_changes` (ver favorites.py y
+# el listener de abajo para lo que pasa por el ORM) y `flask
+# refresh-related` solo recalcula los usuarios de la cola, tanto con la
+# BD principal como con shards (solo se lee el shard de cada usuario):
+#
+#   C += A_nuevaᵀ·A_nueva - A_viejaᵀ·A_vieja     (solo esas filas)
+#
+# y reescribe el top-K de los items que aparecen en esas filas. Luego
+# borra de la cola exactamente las filas procesadas: una que se confirme
+# tarde (con id menor) sigue ahí para el siguiente refresco, y procesar
+# dos veces a un usuario da el mismo resultado. Si no hay estado
+# guardado (o con --full) se construye todo de una vez. Un DELETE o
+# UPDATE con Core sobre las tablas de favoritos fuera de favorites.py no
+# deja rastro en la cola: después hay que refrescar con --full.
+# ----------------------------------------------------------------
+
+TOP_K = 20
+DEFAULT_LIMIT = 10
+# Sube si cambia el significado del estado guardado: fuerza una construcción completa
+STATE_VERSION = 2
+
+
+def _favorites_matrix(users, items, shape):
+    """Matriz CSR de unos; los favoritos duplicados cuentan una vez."""
+    matrix = sparse.csr_matrix((np.ones(len(users), dtype=np.int32), (users, items)), shape=shape)
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+def _resize(matrix, shape):
+    if matrix.shape != shape:
+        matrix = matrix.copy()
+        matrix.resize(shape)
+    return matrix
+
+
+class CooccurrenceIndex:
+
+    def __init__(self, kind, directory, top_k=TOP_K):
+        self.kind = kind
+        self.table, self.item_col, self.model = FAVORITE_KINDS[kind]
+        self.path = os.path.join(directory, f'{kind}.npz')
+        self.top_k = top_k
+        self.users = None        # A: usuario x item
+        self.cooccurrence = None  # C: item x item, diagonal a cero
+
+    # ------------------------- estado en disco -------------------------
+
+    def load(self):
+        try:
+            with np.load(self.path) as state:
+                if 'version' not in state or int(state['version']) != STATE_VERSION:
+                    return False
+                self.users = sparse.csr_matrix(
+                    (np.ones(len(state['a_indices']), dtype=np.int32), state['a_indices'], state['a_indptr']),
+                    shape=tuple(state['a_shape']))
+                self.cooccurrence = sparse.csr_matrix(
+                    (state['c_data'], state['c_indices'], state['c_indptr']),
+                    shape=tuple(state['c_shape']))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def save(self):
+        tmp = f'{self.path}.tmp{os.getpid()}.npz'
+        np.savez(tmp,
+                 a_indices=self.users.indices, a_indptr=self.users.indptr,
+                 a_shape=np.array(self.users.shape),
+                 c_data=self.cooccurrence.data, c_indices=self.cooccurrence.indices,
+                 c_indptr=self.cooccurrence.indptr, c_shape=np.array(self.cooccurrence.shape),
+                 version=np.array(STATE_VERSION))
+        os.replace(tmp, self.path)
+
+    # ----------------------------- cálculo -----------------------------
+
+    def _shape(self, max_user, max_item):
+        return (int(max_user or 0) + 1, int(max_item or 0) + 1)
+
+    def pending_changes(self):
+        """Filas de `favorite_changes` de este tipo: [(id, user_id, item_id)]."""
+        return db.session.execute(
+            select(FavoriteChange.id, FavoriteChange.user_id, FavoriteChange.item_id)
+            .where(FavoriteChange.kind == self.kind)
+            .order_by(FavoriteChange.id)
+        ).all()
+
+    def _favorite_rows(self, user_ids=None):
+        """(user_id, item_id) de todos los usuarios o solo de `user_ids`."""
+        shards = get_favorite_shards()
+        if shards is not None:
+            return shards.favorite_pairs(self.kind, user_ids)
+        query = select(self.table.c.user_id, self.item_col)
+        if user_ids is None:
+            return db.session.execute(query).all()
+        rows = []
+        for chunk in chunks(user_ids):
+            rows.extend(db.session.execute(query.where(self.table.c.user_id.in_(chunk))).all())
+        return rows
+
+    def build(self):
+        """Construcción completa. Devuelve los items cuyo top-K cambió."""
+        rows = self._favorite_rows()
+        users = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        items = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+        shape = self._shape(users.max() if len(rows) else 0, items.max() if len(rows) else 0)
+
+        self.users = _favorites_matrix(users, items, shape)
+        cooccurrence = (self.users.T @ self.users).tocsr()
+        cooccurrence.setdiag(0)
+        cooccurrence.eliminate_zeros()
+        self.cooccurrence = cooccurrence
+        return np.arange(shape[1])
+
+    def _affected_users(self, changes):
+        affected = {user_id for _, user_id, _ in changes if user_id is not None}
+        # Un item quitado a todos: afecta a los usuarios que lo tenían en A
+        items = [item_id for _, user_id, item_id in changes
+                 if user_id is None and item_id is not None and item_id < self.users.shape[1]]
+        if items:
+            affected.update(int(user_id) for user_id in np.unique(self.users[:, items].nonzero()[0]))
+        return sorted(affected)
+
+    def refresh(self, changes):
+        """
+        Actualización incremental con la cola `changes` (pending_changes()).
+        Devuelve (usuarios recalculados, items cambiados).
+        """
+        affected = self._affected_users(changes)
+        if not affected:
+            return affected, np.array([], dtype=np.int64)
+
+        rows = self._favorite_rows(affected)
+        # Fila k de `new_rows` = favoritos actuales del usuario affected[k]
+        position = {user_id: k for k, user_id in enumerate(affected)}
+        max_item = max([self.users.shape[1] - 1] + [r[1] for r in rows])
+        shape = self._shape(max(self.users.shape[0] - 1, affected[-1]), max_item)
+        users = _resize(self.users, shape)
+        cooccurrence = _resize(self.cooccurrence, (shape[1], shape[1]))
+
+        new_rows = _favorites_matrix(
+            np.array([position[r[0]] for r in rows], dtype=np.int64),
+            np.array([r[1] for r in rows], dtype=np.int64),
+            (len(affected), shape[1]))
+        old_rows = users[affected]
+
+        cooccurrence = (cooccurrence - old_rows.T @ old_rows + new_rows.T @ new_rows).tocsr()
+        cooccurrence.setdiag(0)
+        cooccurrence.eliminate_zeros()
+
+        # A sin las filas afectadas + las filas nuevas colocadas en su sitio
+        keep = np.ones(shape[0], dtype=np.int32)
+        keep[affected] = 0
+        placement = sparse.csr_matrix(
+            (np.ones(len(affected), dtype=np.int32), (affected, np.arange(len(affected)))),
+            shape=(shape[0], len(affected)))
+        self.users = (sparse.diags(keep, dtype=np.int32) @ users + placement @ new_rows).tocsr()
+        self.cooccurrence = cooccurrence
+        changed = np.union1d(old_rows.indices, new_rows.indices)
+        return affected, changed
+
+    def top_related(self, item_id):
+        """[(related_id, fans en común)] ordenado por fans desc e id."""
+        row = self.cooccurrence
+        start, end = row.indptr[item_id], row.indptr[item_id + 1]
+        scores, related = row.data[start:end], row.indices[start:end]
+        # Orden total (empates por id) para que el top-K sea estable
+        order = np.lexsort((related, -scores))[:self.top_k]
+        return [(int(related[i]), int(scores[i])) for i in order]
+
+    def write_top_k(self, items):
+        """Reescribe en `related_items` el top-K de `items` (en la sesión actual)."""
+        for chunk in chunks(int(i) for i in items):
+            db.session.execute(delete(RelatedItem).where(
+                RelatedItem.kind == self.kind, RelatedItem.item_id.in_(chunk)))
+            rows = [{'kind': self.kind, 'item_id': item_id, 'rank': rank,
+                     'related_id': related_id, 'score': score}
+                    for item_id in chunk if item_id < self.cooccurrence.shape[0]
+                    for rank, (related_id, score) in enumerate(self.top_related(item_id))]
+            if rows:
+                db.session.execute(insert(RelatedItem), rows)
+
+
+def refresh_related(directory, full=False):
+    """
+    Actualiza el top-K de ambos tipos. Un flock evita dos refrescos a la
+    vez sobre el mismo estado. Devuelve {tipo: (modo, usuarios, items)}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    report = {}
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        for kind in FAVORITE_KINDS:
+            index = CooccurrenceIndex(kind, directory)
+            # La cola se lee antes que los favoritos: lo que llegue después
+            # se queda para el siguiente refresco
+            changes = index.pending_changes()
+            if full or not index.load():
+                changed = index.build()
+                mode, users = 'full', int(np.count_nonzero(np.diff(index.users.indptr)))
+            else:
+                affected, changed = index.refresh(changes)
+                mode, users = 'incremental', len(affected)
+            index.write_top_k(changed)
+            db.session.commit()
+            # El estado se guarda después del commit y la cola se vacía
+            # después de guardarlo: si algo falla antes, el siguiente
+            # refresco vuelve a procesar los mismos cambios
+            index.save()
+            for chunk in chunks(change_id for change_id, _, _ in changes):
+                db.session.execute(delete(FavoriteChange).where(FavoriteChange.id.in_(chunk)))
+            db.session.commit()
+            report[kind] = (mode, users, len(changed))
+    return report
+
+
+def _record_orm_changes(session, flush_context):
+    """
+    Encola los cambios de favoritos que no pasan por favorites.py: filas
+    editadas desde flask-admin y borrados de usuarios o items cuyos
+    favoritos se van con la relación.
+    """
+    rows = []
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        for model, kind, item_attr in ((FavoritePlanet, 'planet', 'planet_id'),
+                                       (FavoriteCharacter, 'people', 'person_id')):
+            if isinstance(obj, model):
+                rows.append({'kind': kind, 'user_id': obj.user_id, 'item_id': getattr(obj, item_attr)})
+                # Al editar una fila también cuenta el usuario/item de antes
+                previous = inspect(obj).committed_state if obj in session.dirty else {}
+                if 'user_id' in previous or item_attr in previous:
+                    rows.append({'kind': kind, 'user_id': previous.get('user_id', obj.user_id),
+                                 'item_id': previous.get(item_attr, getattr(obj, item_attr))})
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            rows.extend({'kind': kind, 'user_id': obj.id, 'item_id': None} for kind in FAVORITE_KINDS)
+        elif isinstance(obj, Planet):
+            rows.append({'kind': 'planet', 'user_id': None, 'item_id': obj.id})
+        elif isinstance(obj, Person):
+            rows.append({'kind': 'people', 'user_id': None, 'item_id': obj.id})
+    record_favorite_changes(rows, session)
+
+
+def register_favorite_tracking(session):
+    if not event.contains(session, 'after_flush', _record_orm_changes):
+        event.listen(session, 'after_flush', _record_orm_changes)
+
+
+def _related_view(kind, item_id, not_found):
+    _, _, model = FAVORITE_KINDS[kind]
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_LIMIT)), 1), TOP_K)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if db.session.get(model, item_id) is None:
+        return jsonify({'error': not_found}), 404
+    rows = (db.session.query(model.id, model.name, RelatedItem.score)
+            .join(RelatedItem, RelatedItem.related_id == model.id)
+            .filter(RelatedItem.kind == kind, RelatedItem.item_id == item_id)
+            .order_by(RelatedItem.rank)
+            .limit(limit)
+            .all())
+    return jsonify({
+        'id': item_id,
+        'related': [{'id': r.id, 'name': r.name, 'fans_in_common': r.score} for r in rows]
+    }), 200
+
+
+def _related_spec(tag, id_name, label, not_found):
+    return {
+        'tags': [tag],
+        'summary': f'{label} que suelen estar en los mismos favoritos',
+        'parameters': [
+            {
+                'name': id_name,
+                'in': 'path',
+                'type': 'integer',
+                'required': True
+            },
+            {
+                'name': 'limit',
+                'in': 'query',
+                'description': f'Número de recomendaciones (máximo {TOP_K})',
+                'required': False,
+                'type': 'integer'
+            }
+        ],
+        'responses': {
+            200: {
+                'description': 'Recomendaciones ordenadas por fans en común',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'id': {'type': 'integer', 'example': 1},
+                        'related': {
+                            'type': 'array',
+                            'items': {
+                                'type': 'object',
+                                'properties': {
+                                    'id':             {'type': 'integer', 'example': 2},
+                                    'name':           {'type': 'string',  'example': 'Alderaan'},
+                                    'fans_in_common': {'type': 'integer', 'example': 12}
+                                }
+                            }
+                        }
+                    }
+                }
+            },
+            404: {
+                'description': not_found,
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'error': {'type': 'string', 'example': not_found}
+                    }
+                }
+            }
+        }
+    }
+
+
+def setup_related(app):
+    directory = os.environ.get('RELATED_STATE_DIR') or os.path.join(app.instance_path, 'related')
+    register_favorite_tracking(db.session)
+
+    @app.route('/planets/<int:planet_id>/related', methods=['GET'])
+    @swag_from(_related_spec('planets', 'planet_id', 'Planetas', 'Planet not found'))
+    def get_related_planets(planet_id):
+        return _related_view('planet', planet_id, 'Planet not found')
+
+    @app.route('/people/<int:people_id>/related', methods=['GET'])
+    @swag_from(_related_spec('people', 'people_id', 'Personajes', 'Person not found'))
+    def get_related_people(people_id):
+        return _related_view('people', people_id, 'Person not found')
+
+    @app.cli.command('refresh-related')
+    @click.option('--full', is_flag=True, help='Reconstruye todo ignorando el estado guardado')
+    def refresh_related_command(full):
+        """Recalcula las recomendaciones a partir de los favoritos nuevos."""
+        start = time.perf_counter()
+        for kind, (mode, users, items) in refresh_related(directory, full).items():
+            click.echo(f'{kind}: {mode} refresh, {users} users, {items} items updated')
+        click.echo(f'Done in {time.perf_counter() - start:.2f}s')
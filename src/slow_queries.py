@@ -0,0 +1,180 @@
+# src/slow_queries.py
+
+import os
+import re
+import sys
+import json
+import time
+import threading
+from datetime import datetime
+
+from flask import request, has_request_context
+from sqlalchemy import event
+from src.models import db
+
+# ----------------------------------------------------------------
+# Log de consultas lentas.
+#
+# Dos listeners del engine (before/after_cursor_execute) cronometran
+# cada sentencia; el coste por sentencia son dos perf_counter() y un
+# acceso a conn.info, así que se puede dejar activo en producción. Las que
+# superan SLOW_QUERY_MS se escriben como una línea JSON con:
+#
+#   sql       la sentencia normalizada (literales -> ?, listas IN colapsadas)
+#   params    la forma de los parámetros (tipos, nunca valores)
+#   route     la regla de Flask que originó la consulta (o null)
+#   plan      EXPLAIN / EXPLAIN QUERY PLAN, capturado en el momento
+#
+# El plan se pide con un cursor aparte sobre la misma conexión (ve los
+# mismos datos que la consulta) y como mucho una vez por sentencia
+# normalizada cada EXPLAIN_INTERVAL segundos.
+# ----------------------------------------------------------------
+
+DEFAULT_THRESHOLD_MS = 200
+EXPLAIN_INTERVAL = 60
+MAX_SQL_LENGTH = 4000
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(\?|%s|%\(\w+\)s|:\w+)(\s*,\s*(\?|%s|%\(\w+\)s|:\w+))+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_EXPLAINABLE = ('select', 'with')
+
+
+def normalize_sql(statement):
+    sql = _WHITESPACE.sub(' ', statement).strip()
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    # IN (?, ?, ?, ...) con cualquier número de elementos es la misma consulta
+    sql = _PLACEHOLDER_LIST.sub('(?, ...)', sql)
+    return sql[:MAX_SQL_LENGTH]
+
+
+def _type_shape(values):
+    """['int', 'int', 'str'] -> ['int x2', 'str']"""
+    shape = []
+    for value in values:
+        name = type(value).__name__
+        if shape and shape[-1][0] == name:
+            shape[-1][1] += 1
+        else:
+            shape.append([name, 1])
+    return [name if count == 1 else f'{name} x{count}' for name, count in shape]
+
+
+def parameter_shape(parameters, executemany):
+    if executemany:
+        rows = list(parameters)
+        return {'rows': len(rows), 'row': parameter_shape(rows[0], False) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return _type_shape(parameters)
+    return None
+
+
+class SlowQueryLog:
+
+    def __init__(self, path, threshold_ms, max_bytes=16 * 1024 * 1024):
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        self.max_bytes = max_bytes
+        self._explained = {}        # sql normalizada -> último EXPLAIN (monotonic)
+        self._lock = threading.Lock()
+
+    # ----------------------- listeners del engine -----------------------
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Una conexión ejecuta una sentencia cada vez: basta un solo valor
+        conn.info['query_start'] = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop('query_start', time.perf_counter())
+        if elapsed < self.threshold:
+            return
+        try:
+            self.record(conn, statement, parameters, executemany, elapsed)
+        except Exception:
+            # El log nunca debe romper la consulta que se está midiendo
+            pass
+
+    # ----------------------------- registro -----------------------------
+
+    def record(self, conn, statement, parameters, executemany, elapsed):
+        sql = normalize_sql(statement)
+        entry = {
+            'ts': datetime.utcnow().isoformat() + 'Z',
+            'duration_ms': round(elapsed * 1000, 2),
+            'sql': sql,
+            'params': parameter_shape(parameters, executemany),
+            'route': None,
+            'method': None,
+            'pid': os.getpid(),
+            'plan': None,
+        }
+        if has_request_context():
+            entry['route'] = request.url_rule.rule if request.url_rule else request.path
+            entry['method'] = request.method
+        if not executemany and self._should_explain(sql, statement):
+            entry['plan'] = self.explain(conn, statement, parameters)
+        self.write(entry)
+
+    def _should_explain(self, sql, statement):
+        if not statement.lstrip().lower().startswith(_EXPLAINABLE):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(sql, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+                return False
+            self._explained[sql] = now
+            if len(self._explained) > 1024:
+                self._explained.clear()
+        return True
+
+    def explain(self, conn, statement, parameters):
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        # Cursor DBAPI aparte: no pasa por los eventos del engine ni toca el resultado pendiente
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [list(row) if isinstance(row, (tuple, list)) else row for row in cursor.fetchall()]
+        except Exception as error:
+            return {'error': str(error)}
+        finally:
+            cursor.close()
+
+    def write(self, entry):
+        line = (json.dumps(entry, default=str) + '\n').encode('utf-8')
+        if self.path == '-':
+            sys.stderr.buffer.write(line)
+            sys.stderr.flush()
+            return
+        # Una sola write con O_APPEND por línea: varios workers pueden compartir el fichero
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                if os.fstat(fd).st_size > self.max_bytes:
+                    os.replace(self.path, self.path + '.1')
+            finally:
+                os.close(fd)
+
+    def attach(self, engine):
+        for name in ('before_cursor_execute', 'after_cursor_execute'):
+            listener = getattr(self, name)
+            if not event.contains(engine, name, listener):
+                event.listen(engine, name, listener)
+
+
+def setup_slow_query_log(app):
+    threshold = float(os.environ.get('SLOW_QUERY_MS', DEFAULT_THRESHOLD_MS))
+    if threshold <= 0:
+        return
+    path = os.environ.get('SLOW_QUERY_LOG') or os.path.join(app.instance_path, 'slow_queries.jsonl')
+    if path != '-':
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    slow_log = SlowQueryLog(path, threshold)
+    app.extensions['slow_query_log'] = slow_log
+    with app.app_context():
+        for engine in db.engines.values():
+            slow_log.attach(engine)
@@ -0,0 +1,340 @@
+# src/snapshots.py
+
+import os
+import gzip
+import fcntl
+import time
+import shutil
+import threading
+from functools import wraps
+
+import click
+from flask import Response, request, send_file, current_app
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.models import db, Person, Planet
+from src.changes import on_catalog_commit, get_latest_seq
+from src.warmup import on_warmup
+from src.catalog_segment import CatalogSegment, write_segment
+
+# ----------------------------------------------------------------
+# Snapshots estáticos de GET /people y GET /planets.
+#
+# Cuando el catálogo cambia se renderizan las respuestas completas (y
+# su variante gzip) a ficheros versionados:
+#
+#   <dir>/<version>/people.json[.gz]
+#   <dir>/<version>/planets.json[.gz]
+#   <dir>/<version>/people.seg, planets.seg  -> un JSON por item (catalog_segment.py)
+#   <dir>/CURRENT           -> versión publicada (se sustituye con os.replace)
+#
+# La versión es el último seq de `catalog_changes`. Las rutas de listado
+# sirven el fichero con send_file (sendfile bajo gunicorn) o delegan en
+# el proxy con X-Accel-Redirect, sin tocar la BD ni serializar en Python.
+# Las rutas de detalle leen el item del segmento, abierto con mmap en
+# cada worker: todos comparten las mismas páginas de memoria.
+#
+# Solo un proceso construye cada versión (flock sobre <dir>/.build.lock);
+# los demás detectan la nueva generación con el stat() de CURRENT que ya
+# hacen en cada petición.
+#
+# Lectura de las propias escrituras: tras cada commit que cambia el
+# catálogo el worker apunta el último seq en <dir>/LATEST antes de
+# responder. Mientras LATEST vaya por delante de CURRENT (la
+# reconstrucción en segundo plano aún no ha publicado) todos los workers
+# de la máquina sirven desde la BD, así que quien escribe ve su cambio
+# en la siguiente petición. Escrituras hechas desde otra máquina (o con
+# SQL directo) no pasan por LATEST: esas se ven tras `check_interval`
+# segundos más lo que tarde la reconstrucción.
+# ----------------------------------------------------------------
+
+SNAPSHOT_ENTITIES = {
+    'people': Person,
+    'planets': Planet,
+}
+KEEP_VERSIONS = 2
+DEFAULT_CHECK_INTERVAL = 5
+
+
+def _write_atomic(path, data):
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'wb') as handle:
+        handle.write(data)
+    os.replace(tmp, path)
+
+
+class SnapshotStore:
+
+    def __init__(self, app, directory, accel_prefix=None, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.app = app
+        self.directory = directory
+        self.accel_prefix = accel_prefix
+        self.check_interval = check_interval
+        self._current = (None, None)      # (mtime_ns de CURRENT, versión)
+        self._latest = (None, 0)          # (mtime_ns de LATEST, último seq escrito)
+        self._last_check = 0.0
+        self._wakeup = threading.Event()
+        self._worker_pid = None
+        self._lock = threading.Lock()
+        self._segments = {}               # entidad -> (versión, CatalogSegment)
+
+    # -------------------------- lectura --------------------------
+
+    def current_version(self):
+        """Versión publicada. Un stat() por llamada; se relee solo si cambió."""
+        pointer = os.path.join(self.directory, 'CURRENT')
+        try:
+            mtime = os.stat(pointer).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._current[0]:
+            with open(pointer) as handle:
+                self._current = (mtime, handle.read().strip())
+        return self._current[1]
+
+    def latest_written(self):
+        """Último seq escrito por esta máquina (LATEST), con el mismo stat() barato."""
+        pointer = os.path.join(self.directory, 'LATEST')
+        try:
+            mtime = os.stat(pointer).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+        if mtime != self._latest[0]:
+            with open(pointer) as handle:
+                self._latest = (mtime, int(handle.read().strip() or 0))
+        return self._latest[1]
+
+    def published_version(self):
+        """Versión que se puede servir, o None si falta o va por detrás de LATEST."""
+        version = self.current_version()
+        if version is None or int(version) < self.latest_written():
+            return None
+        return version
+
+    def path_for(self, version, entity, compressed):
+        name = f'{entity}.json.gz' if compressed else f'{entity}.json'
+        return os.path.join(self.directory, version, name)
+
+    # ------------------------ construcción ------------------------
+
+    def build(self):
+        """Renderiza el catálogo a una nueva versión y la publica. Devuelve la versión."""
+        with open(os.path.join(self.directory, '.build.lock'), 'w') as lock:
+            # Si otro proceso está construyendo, esperamos y normalmente
+            # encontraremos su versión ya publicada
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return self._build()
+
+    def _build(self):
+        # Sesión propia sobre una sola transacción: versión y datos coherentes
+        with db.engine.connect() as connection, Session(bind=connection) as session:
+            version = str(get_latest_seq(session))
+            if version == self.current_version():
+                return version
+            rendered = {}
+            for entity, model in SNAPSHOT_ENTITIES.items():
+                items = [obj.serialize() for obj in session.scalars(select(model).order_by(model.id))]
+                # Exactamente los cuerpos que devolvería jsonify() en las rutas
+                rendered[entity] = (
+                    self.app.json.response(items).get_data(),
+                    [(item['id'], self.app.json.response(item).get_data()) for item in items]
+                )
+
+        staging = os.path.join(self.directory, f'.staging-{version}-{os.getpid()}')
+        os.makedirs(staging, exist_ok=True)
+        for entity, (body, details) in rendered.items():
+            _write_atomic(os.path.join(staging, f'{entity}.json'), body)
+            _write_atomic(os.path.join(staging, f'{entity}.json.gz'),
+                          gzip.compress(body, compresslevel=9, mtime=0))
+            write_segment(os.path.join(staging, f'{entity}.seg'), details)
+        final = os.path.join(self.directory, version)
+        try:
+            os.rename(staging, final)
+        except OSError:
+            # Otro proceso publicó la misma versión a la vez
+            shutil.rmtree(staging, ignore_errors=True)
+
+        _write_atomic(os.path.join(self.directory, 'CURRENT'), version.encode('ascii'))
+        self._prune(version)
+        return version
+
+    def _prune(self, keep_version):
+        versions = sorted((name for name in os.listdir(self.directory) if name.isdigit()), key=int)
+        # Conservamos la anterior: puede haber respuestas enviándola todavía
+        for name in versions[:-KEEP_VERSIONS]:
+            if name != keep_version:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def catalog_committed(self):
+        """
+        Hook de on_catalog_commit: apunta el seq recién confirmado en LATEST
+        (solo si es mayor que el que ya hay) y pide la reconstrucción.
+        """
+        with db.engine.connect() as connection:
+            seq = get_latest_seq(connection)
+        with open(os.path.join(self.directory, '.latest.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if seq > self.latest_written():
+                _write_atomic(os.path.join(self.directory, 'LATEST'), str(seq).encode('ascii'))
+        self.request_rebuild()
+
+    def request_rebuild(self):
+        """Pide una reconstrucción en segundo plano (varias peticiones se agrupan)."""
+        with self._lock:
+            if self._worker_pid != os.getpid():
+                self._worker_pid = os.getpid()
+                self._wakeup = threading.Event()
+                threading.Thread(target=self._run, daemon=True).start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self.build()
+            except Exception:
+                self.app.logger.exception('Catalog snapshot build failed')
+
+    def check_stale(self):
+        """
+        Como mucho cada `check_interval` segundos por proceso, compara la
+        versión publicada con el log (cubre escrituras de otras máquinas).
+        """
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        if str(get_latest_seq()) != self.current_version():
+            self.request_rebuild()
+
+    # -------------------------- servir --------------------------
+
+    def response(self, entity):
+        """Response con el snapshot vigente, o None si aún no existe o va por detrás."""
+        version = self.published_version()
+        if version is None:
+            return None
+        compressed = 'gzip' in request.headers.get('Accept-Encoding', '')
+        path = self.path_for(version, entity, compressed)
+        etag = f'{entity}-{version}' + ('-gz' if compressed else '')
+
+        if self.accel_prefix:
+            response = Response(mimetype='application/json')
+            response.headers['X-Accel-Redirect'] = self.accel_prefix.rstrip('/') + '/' + \
+                os.path.relpath(path, self.directory)
+            response.set_etag(etag)
+        else:
+            try:
+                response = send_file(path, mimetype='application/json', etag=etag,
+                                     conditional=True, max_age=0)
+            except FileNotFoundError:
+                return None
+        if compressed:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['X-Catalog-Version'] = version
+        return response
+
+    def buffered(self, response):
+        """
+        La misma respuesta con el cuerpo en memoria, para quien la consume
+        dentro del proceso (POST /batch): send_file la marca como
+        direct_passthrough y con X-Accel-Redirect el cuerpo lo pone el proxy.
+        """
+        accel = response.headers.get('X-Accel-Redirect')
+        if accel is not None and self.accel_prefix:
+            relative = accel[len(self.accel_prefix.rstrip('/')) + 1:]
+            with open(os.path.join(self.directory, relative), 'rb') as handle:
+                response.set_data(handle.read())
+            del response.headers['X-Accel-Redirect']
+        elif response.direct_passthrough:
+            response.direct_passthrough = False
+            body = response.get_data()
+            response.close()    # cierra el fichero de send_file
+            response.set_data(body)
+        return response
+
+    def item_response(self, entity, item_id):
+        """Response con el item leído del segmento compartido, o None."""
+        version = self.published_version()
+        if version is None:
+            return None
+        cached = self._segments.get(entity)
+        if cached is None or cached[0] != version:
+            try:
+                cached = (version, CatalogSegment(os.path.join(self.directory, version, f'{entity}.seg')))
+            except (FileNotFoundError, ValueError):
+                return None
+            # No se cierra el mmap anterior: otro hilo puede estar leyéndolo
+            self._segments[entity] = cached
+        body = cached[1].get(item_id)
+        if body is None:
+            return None
+        response = Response(body, mimetype='application/json')
+        response.set_etag(f'{entity}-{item_id}-{version}')
+        response.headers['X-Catalog-Version'] = version
+        return response.make_conditional(request)
+
+
+def get_snapshot_store():
+    return current_app.extensions['catalog_snapshots']
+
+
+def catalog_snapshot(entity):
+    """
+    Sirve el listado desde el snapshot si existe; si no, ejecuta la
+    vista normal y pide que se construya.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            store = get_snapshot_store()
+            store.check_stale()
+            response = store.response(entity)
+            if response is not None:
+                return response
+            store.request_rebuild()
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def catalog_item(entity, id_arg):
+    """
+    Sirve el detalle desde el segmento compartido. Si el item no está
+    (o aún no hay snapshot) se ejecuta la vista normal, que responde el
+    404 o el item recién creado.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            store = get_snapshot_store()
+            store.check_stale()
+            response = store.item_response(entity, kwargs[id_arg])
+            if response is not None:
+                return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def setup_snapshots(app):
+    directory = os.environ.get('CATALOG_SNAPSHOT_DIR') or os.path.join(app.instance_path, 'snapshots')
+    os.makedirs(directory, exist_ok=True)
+    store = SnapshotStore(
+        app,
+        directory,
+        accel_prefix=os.environ.get('CATALOG_SNAPSHOT_ACCEL_PREFIX'),
+        check_interval=float(os.environ.get('CATALOG_SNAPSHOT_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL))
+    )
+    app.extensions['catalog_snapshots'] = store
+    on_catalog_commit(app, store.catalog_committed)
+    # Los workers arrancan con el snapshot ya publicado
+    on_warmup(app, store.build)
+
+    @app.cli.command('build-snapshots')
+    def build_snapshots_command():
+        """Renderiza y publica los snapshots del catálogo."""
+        click.echo(f'Published catalog snapshot version {store.build()} in {directory}')
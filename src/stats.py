@@ -0,0 +1,159 @@
+# src/stats.py
+
+import threading
+
+import numpy as np
+from flask import request, jsonify
+from flasgger import swag_from
+from sqlalchemy import select, func
+from src.models import db, Person, Planet
+from src.changes import get_latest_seq
+
+# ----------------------------------------------------------------
+# GET /stats: agregados del catálogo para analítica.
+#
+#  - people: distribuciones de género y color de ojos con GROUP BY.
+#  - planets: población total, media y percentiles por clima y por
+#    terreno. Se cargan las tres columnas una vez en arrays de NumPy
+#    (snapshot columnar) y todo se calcula vectorizado: los percentiles
+#    no se pueden agregar en SQL de forma portable y los campos
+#    "arid, temperate" hay que separarlos en valores sueltos.
+#
+# El resultado se guarda por proceso junto a la versión del catálogo
+# (último seq del change log) y se sirve con ETag hasta que cambie.
+# ----------------------------------------------------------------
+
+PERCENTILES = (50, 90, 99)
+UNKNOWN = 'unknown'
+
+
+def _tokens(value):
+    """'arid, temperate' -> ['arid', 'temperate']; vacío -> ['unknown']"""
+    tokens = [token.strip().lower() for token in (value or '').split(',') if token.strip()]
+    return tokens or [UNKNOWN]
+
+
+def _population_summary(values):
+    """`values`: int64 ordenado, sin nulos."""
+    if len(values) == 0:
+        return {'known': 0, 'total': 0, 'mean': None,
+                **{f'p{q}': None for q in PERCENTILES}}
+    percentiles = np.percentile(values, PERCENTILES)
+    return {
+        'known': int(len(values)),
+        # Suma en int64: exacta (el float64 de np.mean pierde precisión por encima de 2^53)
+        'total': int(values.sum()),
+        'mean': round(float(values.mean()), 2),
+        **{f'p{q}': float(p) for q, p in zip(PERCENTILES, percentiles)}
+    }
+
+
+def _grouped_population(labels, populations, has_population):
+    """
+    Estadísticas por grupo. `labels` son las cadenas de clima/terreno,
+    `populations` un array int64 y `has_population` la máscara de no nulos.
+    """
+    # Un planeta con varios valores cuenta en cada uno de sus grupos
+    tokens = [_tokens(label) for label in labels]
+    owners = np.repeat(np.arange(len(tokens)), [len(t) for t in tokens])
+    names, codes = np.unique([t for group in tokens for t in group], return_inverse=True)
+    group_sizes = np.bincount(codes, minlength=len(names))
+
+    known = has_population[owners]
+    codes, values = codes[known], populations[owners][known]
+    # Ordenado por (grupo, población): cada grupo es un tramo contiguo y ya ordenado
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+    bounds = np.searchsorted(codes, np.arange(len(names) + 1))
+
+    return {
+        str(name): {'planets': int(group_sizes[i]),
+                    'population': _population_summary(values[bounds[i]:bounds[i + 1]])}
+        for i, name in enumerate(names)
+    }
+
+
+def _distribution(column):
+    rows = db.session.execute(
+        select(column, func.count()).group_by(column).order_by(func.count().desc(), column)
+    ).all()
+    return {(value or UNKNOWN): count for value, count in rows}
+
+
+def compute_stats():
+    rows = db.session.execute(select(Planet.climate, Planet.terrain, Planet.population)).all()
+    climates = [r.climate for r in rows]
+    terrains = [r.terrain for r in rows]
+    has_population = np.array([r.population is not None for r in rows], dtype=bool)
+    populations = np.array([r.population or 0 for r in rows], dtype=np.int64)
+    known = np.sort(populations[has_population])
+
+    return {
+        'planets': {
+            'count': len(rows),
+            'population': _population_summary(known),
+            'by_climate': _grouped_population(climates, populations, has_population),
+            'by_terrain': _grouped_population(terrains, populations, has_population),
+        },
+        'people': {
+            'count': db.session.execute(select(func.count(Person.id))).scalar(),
+            'by_gender': _distribution(Person.gender),
+            'by_eye_color': _distribution(Person.eye_color),
+        }
+    }
+
+
+def setup_stats(app):
+    cache = {'version': None, 'stats': None}
+    cache_lock = threading.Lock()
+
+    @app.route('/stats', methods=['GET'])
+    @swag_from({
+        'tags': ['stats'],
+        'summary': 'Estadísticas agregadas del catálogo',
+        'description': 'Un planeta con varios climas o terrenos ("arid, temperate") '
+                       'cuenta en cada uno de sus grupos. Las poblaciones nulas no '
+                       'entran en total, media ni percentiles (`known` = planetas con población).',
+        'responses': {
+            200: {
+                'description': 'Agregados de planets y people',
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'version': {'type': 'integer', 'example': 42},
+                        'planets': {
+                            'type': 'object',
+                            'properties': {
+                                'count':      {'type': 'integer', 'example': 60},
+                                'population': {'type': 'object'},
+                                'by_climate': {'type': 'object'},
+                                'by_terrain': {'type': 'object'}
+                            }
+                        },
+                        'people': {
+                            'type': 'object',
+                            'properties': {
+                                'count':        {'type': 'integer', 'example': 82},
+                                'by_gender':    {'type': 'object'},
+                                'by_eye_color': {'type': 'object'}
+                            }
+                        }
+                    }
+                }
+            },
+            304: {
+                'description': 'Sin cambios desde el ETag enviado'
+            }
+        }
+    })
+    def get_stats():
+        version = get_latest_seq()
+        with cache_lock:
+            if cache['version'] != version:
+                cache['stats'] = compute_stats()
+                cache['version'] = version
+            stats = cache['stats']
+        response = jsonify({'version': version, **stats})
+        response.set_etag(f'stats-{version}')
+        response.headers['X-Catalog-Version'] = str(version)
+        return response.make_conditional(request)
@@ -0,0 +1,340 @@
+# src/swapi_sync.py
+
+import os
+import json
+import math
+import time
+import queue
+import random
+import asyncio
+import threading
+
+import click
+import aiohttp
+from sqlalchemy import select
+from src.models import db, Person, Planet
+
+# ----------------------------------------------------------------
+# `flask sync-swapi`: trae /people y /planets de una API compatible
+# con SWAPI (https://swapi.dev/api por defecto) y los vuelca en las
+# tablas `people` y `planets`.
+#
+# Descarga (asyncio + aiohttp, en un hilo aparte):
+#  - Como mucho `concurrency` peticiones a la vez entre los dos recursos.
+#  - Con la primera página se sabe cuántas hay (`count`) y se piden
+#    todas las demás en paralelo; sin `count` se sigue `next` una a una.
+#  - Peticiones condicionales: el ETag / Last-Modified de cada página se
+#    guarda en SWAPI_SYNC_STATE y un 304 se salta sin tocar la BD.
+#  - Reintentos con backoff exponencial y jitter ante errores de red,
+#    429 y 5xx (respetando Retry-After). Un 4xx aborta la sincronización.
+#
+# Escritura (en el hilo del comando, con su app context): las páginas
+# llegan por una cola acotada y se hace upsert por nombre (`name` es
+# único) en lotes de `batch_size` con el ORM, un commit por lote, así
+# que el change log y los hooks de on_catalog_commit se disparan como con
+# cualquier otra escritura. Las filas que ya coinciden no generan UPDATE.
+# Lo que desaparece del upstream no se borra.
+#
+# Los validadores solo se guardan si toda la sincronización termina
+# bien. Tras vaciar la BD (seed.py) hay que usar --full: si no, las
+# páginas sin cambios en el upstream llegarían como 304 y no se cargarían.
+# ----------------------------------------------------------------
+
+DEFAULT_BASE_URL = 'https://swapi.dev/api'
+DEFAULT_CONCURRENCY = 8
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_RETRIES = 4
+DEFAULT_TIMEOUT = 30
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+QUEUE_PAGES = 64
+
+
+def _text(model, field):
+    length = model.__table__.c[field].type.length
+
+    def convert(value):
+        if value is None:
+            return None
+        return str(value)[:length]
+    return convert
+
+
+def _population(value):
+    """SWAPI da la población como texto: '200000', 'unknown'."""
+    value = str(value or '').replace(',', '').strip()
+    return int(value) if value.isdigit() else None
+
+
+# Recurso upstream -> (modelo, {campo: conversión})
+RESOURCES = {
+    'people': (Person, {
+        'name':       _text(Person, 'name'),
+        'birth_year': _text(Person, 'birth_year'),
+        'gender':     _text(Person, 'gender'),
+        'eye_color':  _text(Person, 'eye_color'),
+    }),
+    'planets': (Planet, {
+        'name':       _text(Planet, 'name'),
+        'climate':    _text(Planet, 'climate'),
+        'terrain':    _text(Planet, 'terrain'),
+        'population': _population,
+    }),
+}
+
+
+class SyncError(Exception):
+    pass
+
+
+class SwapiFetcher:
+    """
+    Descarga las páginas de todos los RESOURCES y las deja en `output`
+    como (recurso, resultados). Se ejecuta con asyncio.run() en su hilo.
+    """
+
+    def __init__(self, base_url, output, validators=None, concurrency=DEFAULT_CONCURRENCY,
+                 retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.output = output
+        self.validators = validators or {}
+        self.new_validators = {}
+        self.concurrency = concurrency
+        self.retries = retries
+        self.timeout = timeout
+        self.stopped = threading.Event()
+        self.stats = {resource: {'pages': 0, 'not_modified': 0} for resource in RESOURCES}
+        self.retried = 0
+
+    def page_url(self, resource, page):
+        return f'{self.base_url}/{resource}/?page={page}'
+
+    async def run(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            await asyncio.gather(*(self._collection(session, resource) for resource in RESOURCES))
+
+    async def _collection(self, session, resource):
+        first = self.page_url(resource, 1)
+        body = await self._page(session, resource, first)
+        if body is not None:
+            count, results = body.get('count'), body.get('results') or []
+            pages = math.ceil(count / len(results)) if count and results else None
+            self.new_validators[first]['pages'] = pages
+        else:
+            pages = self.new_validators[first].get('pages')
+
+        if pages is not None:
+            await asyncio.gather(*(self._page(session, resource, self.page_url(resource, page))
+                                   for page in range(2, pages + 1)))
+            return
+        # Sin `count`: hay que seguir los enlaces `next`
+        url = first
+        while True:
+            url = self.new_validators[url].get('next')
+            if not url:
+                break
+            await self._page(session, resource, url)
+
+    async def _page(self, session, resource, url):
+        """Descarga una página y la encola. Devuelve el cuerpo, o None si no cambió."""
+        cached = self.validators.get(url)
+        body = await self._get(session, url, cached)
+        stats = self.stats[resource]
+        stats['pages'] += 1
+        if body is None:
+            stats['not_modified'] += 1
+            self.new_validators[url] = dict(cached)
+            return None
+        self.new_validators[url]['next'] = body.get('next')
+        await asyncio.to_thread(self._put, (resource, body.get('results') or []))
+        return body
+
+    def _put(self, item):
+        # Cola acotada: si la BD va más lenta la descarga espera. Si el
+        # comando ya falló no queda nadie leyendo y se abandona.
+        while not self.stopped.is_set():
+            try:
+                self.output.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise SyncError('Sync aborted')
+
+    async def _get(self, session, url, cached):
+        headers = {}
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+        for attempt in range(self.retries + 1):
+            delay = None
+            try:
+                async with self._semaphore, session.get(url, headers=headers) as response:
+                    if response.status == 304 and cached:
+                        return None
+                    if response.status not in RETRY_STATUSES:
+                        if response.status >= 400:
+                            raise SyncError(f'{url}: HTTP {response.status}')
+                        body = await response.json(content_type=None)
+                        self.new_validators[url] = {'etag': response.headers.get('ETag'),
+                                                    'last_modified': response.headers.get('Last-Modified')}
+                        return body
+                    error = f'HTTP {response.status}'
+                    delay = _retry_after(response.headers.get('Retry-After'))
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as exc:
+                error = repr(exc)
+            if attempt == self.retries:
+                raise SyncError(f'{url}: {error} after {attempt + 1} attempts')
+            self.retried += 1
+            if delay is None:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1)
+            await asyncio.sleep(delay)
+
+
+def _retry_after(value):
+    try:
+        return min(BACKOFF_MAX, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def upsert_batch(resource, records):
+    """
+    Inserta o actualiza por nombre y hace commit.
+    Devuelve (creados, actualizados, sin cambios).
+    """
+    model, fields = RESOURCES[resource]
+    rows = {}
+    for record in records:
+        row = {field: convert(record.get(field)) for field, convert in fields.items()}
+        if row['name']:
+            rows[row['name']] = row
+    existing = {obj.name: obj for obj in db.session.execute(
+        select(model).where(model.name.in_(list(rows)))
+    ).scalars()}
+
+    created = updated = 0
+    for name, row in rows.items():
+        obj = existing.get(name)
+        if obj is None:
+            db.session.add(model(**row))
+            created += 1
+            continue
+        changed = {field: value for field, value in row.items() if getattr(obj, field) != value}
+        for field, value in changed.items():
+            setattr(obj, field, value)
+        updated += bool(changed)
+    db.session.commit()
+    return created, updated, len(rows) - created - updated
+
+
+def _load_validators(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_validators(path, validators):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as handle:
+        json.dump(validators, handle)
+    os.replace(tmp, path)
+
+
+def sync_swapi(base_url, state_path, full=False, concurrency=DEFAULT_CONCURRENCY,
+               batch_size=DEFAULT_BATCH_SIZE, retries=DEFAULT_RETRIES):
+    """
+    Sincroniza people y planets (con app context). Devuelve un informe con
+    páginas, filas creadas/actualizadas/sin cambios, reintentos y tiempo.
+    """
+    pages = queue.Queue(maxsize=QUEUE_PAGES)
+    validators = {} if full else _load_validators(state_path)
+    fetcher = SwapiFetcher(base_url, pages, validators, concurrency=concurrency, retries=retries)
+    done = object()
+
+    def fetch():
+        try:
+            asyncio.run(fetcher.run())
+            pages.put(done)
+        except BaseException as exc:
+            if not fetcher.stopped.is_set():
+                pages.put(exc)
+
+    report = {resource: {'created': 0, 'updated': 0, 'unchanged': 0} for resource in RESOURCES}
+    pending = {resource: [] for resource in RESOURCES}
+
+    def flush(resource):
+        if pending[resource]:
+            counts = upsert_batch(resource, pending[resource])
+            for key, count in zip(('created', 'updated', 'unchanged'), counts):
+                report[resource][key] += count
+            pending[resource] = []
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=fetch, name='swapi-sync', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            resource, records = item
+            pending[resource].extend(records)
+            if len(pending[resource]) >= batch_size:
+                flush(resource)
+        for resource in RESOURCES:
+            flush(resource)
+    except BaseException:
+        fetcher.stopped.set()
+        db.session.rollback()
+        raise
+    thread.join()
+    elapsed = time.perf_counter() - start
+
+    _save_validators(state_path, fetcher.new_validators)
+    for resource in RESOURCES:
+        report[resource].update(fetcher.stats[resource])
+    total_pages = sum(stats['pages'] for stats in fetcher.stats.values())
+    report['totals'] = {'pages': total_pages, 'retries': fetcher.retried,
+                        'seconds': elapsed, 'pages_per_second': total_pages / elapsed if elapsed else 0.0}
+    return report
+
+
+def setup_swapi_sync(app):
+    state_path = os.environ.get('SWAPI_SYNC_STATE') or os.path.join(app.instance_path, 'swapi_sync.json')
+
+    @app.cli.command('sync-swapi')
+    @click.option('--base-url', default=lambda: os.environ.get('SWAPI_BASE_URL', DEFAULT_BASE_URL),
+                  help='Raíz de la API compatible con SWAPI')
+    @click.option('--concurrency', type=click.IntRange(min=1),
+                  default=lambda: int(os.environ.get('SWAPI_SYNC_CONCURRENCY', DEFAULT_CONCURRENCY)),
+                  help='Peticiones simultáneas como máximo')
+    @click.option('--batch-size', type=click.IntRange(min=1), default=DEFAULT_BATCH_SIZE,
+                  help='Filas por commit')
+    @click.option('--retries', type=click.IntRange(min=0), default=DEFAULT_RETRIES,
+                  help='Reintentos por página')
+    @click.option('--full', is_flag=True, help='Ignora los ETag guardados y lo descarga todo')
+    def sync_swapi_command(base_url, concurrency, batch_size, retries, full):
+        """Importa people y planets desde una API compatible con SWAPI."""
+        try:
+            report = sync_swapi(base_url, state_path, full=full, concurrency=concurrency,
+                                batch_size=batch_size, retries=retries)
+        except SyncError as error:
+            raise click.ClickException(str(error))
+        for resource in RESOURCES:
+            r = report[resource]
+            click.echo(f"{resource}: {r['pages']} pages ({r['not_modified']} not modified), "
+                       f"{r['created']} created, {r['updated']} updated, {r['unchanged']} unchanged")
+        totals = report['totals']
+        click.echo(f"{totals['pages']} pages in {totals['seconds']:.2f}s "
+                   f"({totals['pages_per_second']:.1f} pages/s), {totals['retries']} retries")
@@ -1,5 +1,9 @@
 from flask import jsonify, url_for
 
+# Tamaño de lote para las consultas IN (...): lejos del límite de
+# parámetros por sentencia de SQLite y de listas enormes en Postgres
+IN_CHUNK = 500
+
 class APIException(Exception):
     status_code = 400
 
@@ -15,6 +19,12 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def chunks(values, size=IN_CHUNK):
+    """Parte `values` (cualquier iterable) en listas de como mucho `size`."""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
@@ -0,0 +1,79 @@
+# src/warmup.py
+
+import threading
+
+from sqlalchemy.orm import configure_mappers
+from src.models import db, Person, Planet, User, Post
+from src.favorites import list_favorites, is_favorite, top_favorites
+from src.changes import get_latest_seq
+
+# ----------------------------------------------------------------
+# Arranque en producción con gunicorn (ver gunicorn.conf.py).
+#
+# Con `preload_app` la app se importa una sola vez en el master y los
+# workers la heredan con fork (copy-on-write). Todo lo que se prepare
+# antes del fork -- mappers configurados, SQL compilado en la caché del
+# engine, snapshots del catálogo -- lo comparten todos los workers y ya
+# no se paga en la primera petición de cada uno.
+#
+# Lo que no sobrevive a un fork (conexiones, hilos, pools de procesos)
+# se crea en cada worker, en los hooks de on_worker_start.
+# ----------------------------------------------------------------
+
+
+def on_warmup(app, callback):
+    """Registra `callback()` (con app context) para el calentamiento previo al fork."""
+    app.extensions.setdefault('warmup_hooks', []).append(callback)
+
+
+def on_worker_start(app, callback):
+    """Registra `callback()` para cada proceso worker recién creado."""
+    app.extensions.setdefault('worker_start_hooks', []).append(callback)
+
+
+def _compile_hot_queries():
+    """
+    Ejecuta una vez las consultas de las rutas calientes: SQLAlchemy
+    guarda su SQL compilado en la caché del engine, que se hereda.
+    """
+    Person.query.order_by(Person.id).all()
+    Planet.query.order_by(Planet.id).all()
+    db.session.get(Person, 0)
+    db.session.get(Planet, 0)
+    db.session.get(User, 0)
+    Post.query.filter(Post.user_id == 0).order_by(Post.created_at.desc(), Post.id.desc()).limit(1).all()
+    for kind in ('planet', 'people'):
+        list_favorites(0, kind)
+        is_favorite(0, kind, 0)
+        top_favorites(kind, 1)
+    get_latest_seq()
+
+
+def warm_up(app):
+    """
+    Prepara la app en el master antes del fork. Un paso que falla (p. ej.
+    la BD aún sin migrar) se registra y no impide arrancar.
+    """
+    with app.app_context():
+        configure_mappers()
+        for step in [_compile_hot_queries] + app.extensions.get('warmup_hooks', []):
+            try:
+                step()
+            except Exception:
+                app.logger.exception('Warm-up step %s failed', getattr(step, '__qualname__', step))
+            finally:
+                db.session.remove()
+        # Ninguna conexión abierta debe cruzar el fork; la caché de SQL
+        # compilado vive en el engine y se conserva
+        db.engine.dispose()
+
+
+def start_worker(app):
+    """Después del fork, en cada worker."""
+    with app.app_context():
+        # Por si el master abrió alguna conexión: se abandonan sin cerrarlas,
+        # que el socket sigue siendo del master
+        db.engine.dispose(close=False)
+    for callback in app.extensions.get('worker_start_hooks', []):
+        # En segundo plano: el worker acepta peticiones mientras tanto
+        threading.Thread(target=callback, daemon=True).start()
@@ -1,7 +1,11 @@
 # This file was created to run the application on heroku using gunicorn.
 # Read more about it here: https://devcenter.heroku.com/articles/python-gunicorn
+#
+#   gunicorn -c gunicorn.conf.py src.wsgi:application
 
-from app import app as application
+from src.app import create_app
+
+application = app = create_app()
 
 if __name__ == "__main__":
     application.run()